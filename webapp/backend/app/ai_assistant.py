@@ -1,16 +1,20 @@
 """AI Assistant API endpoints."""
-from fastapi import APIRouter, Depends, HTTPException
+from fastapi import APIRouter, BackgroundTasks, Depends, HTTPException
+from fastapi.concurrency import run_in_threadpool
+from fastapi.responses import ORJSONResponse
+from sqlalchemy import update
 from sqlalchemy.orm import Session
 from pydantic import BaseModel
 from typing import Optional, Dict, Any
+import anyio
 import httpx
 
-from .database import get_db
+from .database import get_db, get_session_factory
 from .models import User, Grant, SubscriptionStatus
-from .auth import get_current_user
+from .auth import get_current_user, invalidate_cached_user
 from .config import settings
 
-router = APIRouter()
+router = APIRouter(default_response_class=ORJSONResponse)
 
 
 class AssistanceRequest(BaseModel):
@@ -19,9 +23,35 @@ class AssistanceRequest(BaseModel):
     assistance_type: str = "analyze"  # analyze, guidance, generate
 
 
+def consume_assistant_credit(db: Session, user_id: int) -> Optional[int]:
+    """Take one AI assistant credit; returns the credits left, or None if there were none."""
+    credits_remaining = db.execute(
+        update(User)
+        .where(User.id == user_id, User.ai_assistant_credits > 0)
+        .values(ai_assistant_credits=User.ai_assistant_credits - 1)
+        .returning(User.ai_assistant_credits)
+    ).scalar_one_or_none()
+    db.commit()
+    return credits_remaining
+
+
+def record_assistant_usage(user_id: int):
+    """Atomically bump a user's AI assistant usage count."""
+    with get_session_factory()() as db:
+        db.execute(
+            update(User)
+            .where(User.id == user_id)
+            .values(ai_assistant_usage_count=User.ai_assistant_usage_count + 1)
+        )
+        db.commit()
+    # Runs as a sync background task on a worker thread; the cache is async
+    anyio.from_thread.run(invalidate_cached_user, user_id)
+
+
 @router.post("/analyze-grant")
 async def analyze_grant(
     request: AssistanceRequest,
+    background_tasks: BackgroundTasks,
     current_user: User = Depends(get_current_user),
     db: Session = Depends(get_db)
 ):
@@ -40,6 +70,14 @@ async def analyze_grant(
     if not grant:
         raise HTTPException(status_code=404, detail="Grant not found")
     
+    # The cached user can be stale, so the credit is checked and taken in one
+    # UPDATE; concurrent requests can't both spend the last one
+    credits_remaining = current_user.ai_assistant_credits
+    if current_user.subscription_status == SubscriptionStatus.PAY_PER_USE:
+        credits_remaining = await run_in_threadpool(consume_assistant_credit, db, current_user.id)
+        if credits_remaining is None:
+            raise HTTPException(status_code=402, detail="No AI Assistant credits remaining")
+    
     # Simulate AI analysis (integrate with existing agent here)
     analysis = {
         "relevance_score": 85.0,
@@ -57,15 +95,11 @@ async def analyze_grant(
         ]
     }
     
-    # Update usage tracking
-    current_user.ai_assistant_usage_count += 1
-    if current_user.subscription_status == SubscriptionStatus.PAY_PER_USE:
-        current_user.ai_assistant_credits -= 1
-    
-    db.commit()
+    # Update usage tracking after the response is sent
+    background_tasks.add_task(record_assistant_usage, current_user.id)
     
     return {
         "grant_id": request.grant_id,
         "analysis": analysis,
-        "credits_remaining": current_user.ai_assistant_credits
+        "credits_remaining": credits_remaining
     }
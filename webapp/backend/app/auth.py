@@ -5,31 +5,78 @@ Authentication system with Google and Microsoft OAuth support.
 from datetime import datetime, timedelta
 from typing import Optional, Dict, Any
 from fastapi import APIRouter, Depends, HTTPException, status, Request
+from fastapi.concurrency import run_in_threadpool
+from fastapi.responses import ORJSONResponse
 from fastapi.security import HTTPBearer, HTTPAuthorizationCredentials
-from sqlalchemy.orm import Session
+from sqlalchemy import inspect
+from sqlalchemy.orm import Session, make_transient_to_detached
 from jose import JWTError, jwt
 from pydantic import BaseModel, EmailStr
 import httpx
+import orjson
 import uuid
 from passlib.context import CryptContext
 
+from .cache import cache_delete, cache_get, cache_set
 from .database import get_db
 from .models import User, Company, UserRole, SubscriptionStatus, CompanySize
 from .config import settings
 
-router = APIRouter()
+router = APIRouter(default_response_class=ORJSONResponse)
 security = HTTPBearer()
 
 # Password hashing
 pwd_context = CryptContext(schemes=["bcrypt"], deprecated="auto")
 
+# JWT verification settings, resolved once at import
+_JWT_KEY = settings.SECRET_KEY
+_JWT_ALGS = [settings.ALGORITHM]
+_JWT_DECODE_OPTIONS = {
+    "verify_aud": False,
+    "verify_iss": False,
+    "verify_at_hash": False,
+    "require_exp": True,
+    "require_sub": True,
+}
+
+# Short-lived cache of user column snapshots keyed by user id, so that
+# authenticated requests can skip the user lookup (and last_login write).
+# Snapshots live in Redis only, so invalidate_cached_user takes effect on
+# every worker at once
+USER_CACHE_TTL = 30  # seconds
+# The password hash never goes into the cache; code that needs it loads it
+# from the database (authenticate_user queries the row itself)
+_USER_CACHE_EXCLUDED = frozenset({"hashed_password"})
+_USER_COLUMNS = tuple(
+    attr.key for attr in inspect(User).column_attrs if attr.key not in _USER_CACHE_EXCLUDED
+)
+_USER_COLUMN_TYPES = {
+    attr.key: attr.columns[0].type.python_type
+    for attr in inspect(User).column_attrs
+    if attr.key not in _USER_CACHE_EXCLUDED
+}
+
+# Shared HTTP client for OAuth provider calls (keeps connections alive)
+_oauth_client: Optional[httpx.AsyncClient] = None
+
+
+class UserSummary(BaseModel):
+    """User summary embedded in token responses."""
+    id: int
+    email: str
+    full_name: str
+    profile_picture_url: Optional[str] = None
+    role: UserRole
+    subscription_status: SubscriptionStatus
+    has_company: bool
+
 
 class TokenResponse(BaseModel):
     """Token response model."""
     access_token: str
     token_type: str = "bearer"
     expires_in: int
-    user: Dict[str, Any]
+    user: UserSummary
 
 
 class UserCreate(BaseModel):
@@ -58,6 +105,19 @@ class CompanyCreate(BaseModel):
     description: Optional[str] = None
 
 
+def _user_summary(user: User) -> UserSummary:
+    """Build the user summary returned alongside access tokens."""
+    return UserSummary(
+        id=user.id,
+        email=user.email,
+        full_name=user.full_name,
+        profile_picture_url=user.profile_picture_url,
+        role=user.role,
+        subscription_status=user.subscription_status,
+        has_company=user.company_id is not None
+    )
+
+
 def verify_password(plain_password: str, hashed_password: str) -> bool:
     """Verify a password against its hash."""
     return pwd_context.verify(plain_password, hashed_password)
@@ -89,11 +149,66 @@ def create_access_token(data: dict, expires_delta: Optional[timedelta] = None):
         expire = datetime.utcnow() + timedelta(minutes=settings.ACCESS_TOKEN_EXPIRE_MINUTES)
     
     to_encode.update({"exp": expire})
-    encoded_jwt = jwt.encode(to_encode, settings.SECRET_KEY, algorithm=settings.ALGORITHM)
+    encoded_jwt = jwt.encode(to_encode, _JWT_KEY, algorithm=settings.ALGORITHM)
     return encoded_jwt
 
 
-def get_current_user(
+def decode_access_token(token: str) -> Dict[str, Any]:
+    """Decode and verify a JWT access token."""
+    return jwt.decode(token, _JWT_KEY, algorithms=_JWT_ALGS, options=_JWT_DECODE_OPTIONS)
+
+
+def user_cache_key(user_id: int) -> str:
+    """Redis key for a user's cached snapshot."""
+    return f"user:{user_id}"
+
+
+def _snapshot_from_json(data: Dict[str, Any]) -> Dict[str, Any]:
+    """Restore datetimes and enums in a user snapshot read back from Redis."""
+    snapshot = {}
+    for key in _USER_COLUMNS:
+        value = data.get(key)
+        python_type = _USER_COLUMN_TYPES[key]
+        if value is not None and not isinstance(value, python_type):
+            value = datetime.fromisoformat(value) if python_type is datetime else python_type(value)
+        snapshot[key] = value
+    return snapshot
+
+
+async def cache_user(user: User) -> None:
+    """Store a snapshot of the user's column values in the user cache."""
+    snapshot = {key: getattr(user, key) for key in _USER_COLUMNS}
+    await cache_set(user_cache_key(user.id), snapshot, USER_CACHE_TTL)
+
+
+async def invalidate_cached_user(user_id: int) -> None:
+    """Drop a user from the user cache after their row has been modified."""
+    await cache_delete(user_cache_key(user_id))
+
+
+async def get_cached_user(user_id: int, db: Session) -> Optional[User]:
+    """Attach a cached user snapshot to the session without querying the database."""
+    data = await cache_get(user_cache_key(user_id))
+    if data is None:
+        return None
+    
+    user = User(**_snapshot_from_json(data))
+    make_transient_to_detached(user)
+    return db.merge(user, load=False)
+
+
+def touch_last_login(db: Session, user_id: int) -> Optional[User]:
+    """Load a user and record the login time; None if the user doesn't exist."""
+    user = db.get(User, user_id)
+    if user is None:
+        return None
+    
+    user.last_login = datetime.utcnow()
+    db.commit()
+    return user
+
+
+async def get_current_user(
     credentials: HTTPAuthorizationCredentials = Depends(security),
     db: Session = Depends(get_db)
 ) -> User:
@@ -105,20 +220,24 @@ def get_current_user(
     )
     
     try:
-        payload = jwt.decode(credentials.credentials, settings.SECRET_KEY, algorithms=[settings.ALGORITHM])
+        payload = decode_access_token(credentials.credentials)
         user_id: int = payload.get("sub")
         if user_id is None:
             raise credentials_exception
     except JWTError:
         raise credentials_exception
     
-    user = db.query(User).filter(User.id == user_id).first()
+    user = await get_cached_user(user_id, db)
+    if user is not None:
+        return user
+    
+    # Update last login (at most once per cache TTL); the sync session runs
+    # on a worker thread so it doesn't block the event loop
+    user = await run_in_threadpool(touch_last_login, db, user_id)
     if user is None:
         raise credentials_exception
     
-    # Update last login
-    user.last_login = datetime.utcnow()
-    db.commit()
+    await cache_user(user)
     
     return user
 
@@ -139,47 +258,60 @@ def get_optional_current_user(
         return None
     
     try:
-        payload = jwt.decode(credentials.credentials, settings.SECRET_KEY, algorithms=[settings.ALGORITHM])
+        payload = decode_access_token(credentials.credentials)
         user_id: int = payload.get("sub")
         if user_id is None:
             return None
         
-        user = db.query(User).filter(User.id == user_id).first()
+        user = db.get(User, user_id)
         return user
     except JWTError:
         return None
 
 
+def get_oauth_client() -> httpx.AsyncClient:
+    """Get the shared OAuth HTTP client, creating it on first use."""
+    global _oauth_client
+    if _oauth_client is None or _oauth_client.is_closed:
+        _oauth_client = httpx.AsyncClient(
+            timeout=10.0,
+            limits=httpx.Limits(max_keepalive_connections=50)
+        )
+    return _oauth_client
+
+
+async def close_oauth_client():
+    """Close the shared OAuth HTTP client."""
+    global _oauth_client
+    if _oauth_client is not None:
+        await _oauth_client.aclose()
+        _oauth_client = None
+
+
 async def get_google_user_info(access_token: str) -> Dict[str, Any]:
     """Get user info from Google OAuth."""
-    async with httpx.AsyncClient() as client:
-        response = await client.get(
-            "https://www.googleapis.com/oauth2/v2/userinfo",
-            headers={"Authorization": f"Bearer {access_token}"}
-        )
-        if response.status_code != 200:
-            raise HTTPException(status_code=400, detail="Invalid Google token")
-        return response.json()
+    response = await get_oauth_client().get(
+        "https://www.googleapis.com/oauth2/v2/userinfo",
+        headers={"Authorization": f"Bearer {access_token}"}
+    )
+    if response.status_code != 200:
+        raise HTTPException(status_code=400, detail="Invalid Google token")
+    return orjson.loads(response.content)
 
 
 async def get_microsoft_user_info(access_token: str) -> Dict[str, Any]:
     """Get user info from Microsoft OAuth."""
-    async with httpx.AsyncClient() as client:
-        response = await client.get(
-            "https://graph.microsoft.com/v1.0/me",
-            headers={"Authorization": f"Bearer {access_token}"}
-        )
-        if response.status_code != 200:
-            raise HTTPException(status_code=400, detail="Invalid Microsoft token")
-        return response.json()
+    response = await get_oauth_client().get(
+        "https://graph.microsoft.com/v1.0/me",
+        headers={"Authorization": f"Bearer {access_token}"}
+    )
+    if response.status_code != 200:
+        raise HTTPException(status_code=400, detail="Invalid Microsoft token")
+    return orjson.loads(response.content)
 
 
-def create_or_update_user(user_info: Dict[str, Any], provider: str, db: Session) -> User:
-    """Create or update user from OAuth provider."""
-    email = user_info.get("email") or user_info.get("mail")
-    if not email:
-        raise HTTPException(status_code=400, detail="Email not provided by OAuth provider")
-    
+def upsert_oauth_user(user_info: Dict[str, Any], provider: str, email: str, db: Session) -> User:
+    """Create or update the user row for an OAuth login."""
     # Check if user exists
     user = db.query(User).filter(User.email == email).first()
     
@@ -225,6 +357,17 @@ def create_or_update_user(user_info: Dict[str, Any], provider: str, db: Session)
     return user
 
 
+async def create_or_update_user(user_info: Dict[str, Any], provider: str, db: Session) -> User:
+    """Create or update user from OAuth provider."""
+    email = user_info.get("email") or user_info.get("mail")
+    if not email:
+        raise HTTPException(status_code=400, detail="Email not provided by OAuth provider")
+    
+    user = await run_in_threadpool(upsert_oauth_user, user_info, provider, email, db)
+    await invalidate_cached_user(user.id)
+    return user
+
+
 @router.post("/google", response_model=TokenResponse)
 async def login_google(request: Request, db: Session = Depends(get_db)):
     """Login with Google OAuth."""
@@ -238,7 +381,7 @@ async def login_google(request: Request, db: Session = Depends(get_db)):
     user_info = await get_google_user_info(access_token)
     
     # Create or update user
-    user = create_or_update_user(user_info, "google", db)
+    user = await create_or_update_user(user_info, "google", db)
     
     # Create JWT token
     token_data = {"sub": user.id}
@@ -247,15 +390,7 @@ async def login_google(request: Request, db: Session = Depends(get_db)):
     return TokenResponse(
         access_token=token,
         expires_in=settings.ACCESS_TOKEN_EXPIRE_MINUTES * 60,
-        user={
-            "id": user.id,
-            "email": user.email,
-            "full_name": user.full_name,
-            "profile_picture_url": user.profile_picture_url,
-            "role": user.role,
-            "subscription_status": user.subscription_status,
-            "has_company": user.company_id is not None
-        }
+        user=_user_summary(user)
     )
 
 
@@ -272,7 +407,7 @@ async def login_microsoft(request: Request, db: Session = Depends(get_db)):
     user_info = await get_microsoft_user_info(access_token)
     
     # Create or update user
-    user = create_or_update_user(user_info, "microsoft", db)
+    user = await create_or_update_user(user_info, "microsoft", db)
     
     # Create JWT token
     token_data = {"sub": user.id}
@@ -281,15 +416,7 @@ async def login_microsoft(request: Request, db: Session = Depends(get_db)):
     return TokenResponse(
         access_token=token,
         expires_in=settings.ACCESS_TOKEN_EXPIRE_MINUTES * 60,
-        user={
-            "id": user.id,
-            "email": user.email,
-            "full_name": user.full_name,
-            "profile_picture_url": user.profile_picture_url,
-            "role": user.role,
-            "subscription_status": user.subscription_status,
-            "has_company": user.company_id is not None
-        }
+        user=_user_summary(user)
     )
 
 
@@ -333,15 +460,7 @@ async def signup(user_data: UserCreate, db: Session = Depends(get_db)):
     return TokenResponse(
         access_token=token,
         expires_in=settings.ACCESS_TOKEN_EXPIRE_MINUTES * 60,
-        user={
-            "id": user.id,
-            "email": user.email,
-            "full_name": user.full_name,
-            "profile_picture_url": user.profile_picture_url,
-            "role": user.role,
-            "subscription_status": user.subscription_status,
-            "has_company": user.company_id is not None
-        }
+        user=_user_summary(user)
     )
 
 
@@ -362,6 +481,7 @@ async def login(user_credentials: UserLogin, db: Session = Depends(get_db)):
     # Update last login
     user.last_login = datetime.utcnow()
     db.commit()
+    await invalidate_cached_user(user.id)
     
     # Create JWT token
     token_data = {"sub": user.id}
@@ -370,36 +490,21 @@ async def login(user_credentials: UserLogin, db: Session = Depends(get_db)):
     return TokenResponse(
         access_token=token,
         expires_in=settings.ACCESS_TOKEN_EXPIRE_MINUTES * 60,
-        user={
-            "id": user.id,
-            "email": user.email,
-            "full_name": user.full_name,
-            "profile_picture_url": user.profile_picture_url,
-            "role": user.role,
-            "subscription_status": user.subscription_status,
-            "has_company": user.company_id is not None
-        }
+        user=_user_summary(user)
     )
 
 
 @router.post("/refresh")
 async def refresh_token(current_user: User = Depends(get_current_user)):
     """Refresh access token."""
+    await invalidate_cached_user(current_user.id)
     token_data = {"sub": current_user.id}
     token = create_access_token(token_data)
     
     return TokenResponse(
         access_token=token,
         expires_in=settings.ACCESS_TOKEN_EXPIRE_MINUTES * 60,
-        user={
-            "id": current_user.id,
-            "email": current_user.email,
-            "full_name": current_user.full_name,
-            "profile_picture_url": current_user.profile_picture_url,
-            "role": current_user.role,
-            "subscription_status": current_user.subscription_status,
-            "has_company": current_user.company_id is not None
-        }
+        user=_user_summary(current_user)
     )
 
 
@@ -0,0 +1,89 @@
+"""
+Redis-backed cache for API responses that change rarely.
+
+Redis is optional: when it is unreachable (or the client isn't installed)
+every lookup is a miss and the endpoints fall back to the database.
+"""
+
+import time
+from typing import Any, Optional
+
+import orjson
+
+from .config import settings
+
+# Back off this long after a Redis failure before trying again
+REDIS_RETRY_SECONDS = 30.0
+
+_redis_client = None
+_redis_retry_at = 0.0
+
+
+def get_redis():
+    """Get the shared async Redis client, or None while Redis is unavailable."""
+    global _redis_client, _redis_retry_at
+    if time.monotonic() < _redis_retry_at:
+        return None
+    if _redis_client is None:
+        try:
+            import redis.asyncio as redis
+        except ImportError:
+            print("⚠️ redis package not installed, response cache disabled")
+            _redis_retry_at = float("inf")
+            return None
+        _redis_client = redis.from_url(
+            settings.REDIS_URL,
+            socket_connect_timeout=0.5,
+            socket_timeout=0.5
+        )
+    return _redis_client
+
+
+def _mark_unavailable(error: Exception):
+    """Skip Redis for a while after a connection or command failure."""
+    global _redis_retry_at
+    print(f"⚠️ Redis unavailable, bypassing cache: {error}")
+    _redis_retry_at = time.monotonic() + REDIS_RETRY_SECONDS
+
+
+async def cache_get(key: str) -> Optional[Any]:
+    """Return the cached JSON value for key, or None on a miss."""
+    client = get_redis()
+    if client is None:
+        return None
+    try:
+        raw = await client.get(key)
+    except Exception as e:
+        _mark_unavailable(e)
+        return None
+    return orjson.loads(raw) if raw is not None else None
+
+
+async def cache_set(key: str, value: Any, ttl: int):
+    """Store a JSON-serializable value under key for ttl seconds."""
+    client = get_redis()
+    if client is None:
+        return
+    try:
+        await client.set(key, orjson.dumps(value), ex=ttl)
+    except Exception as e:
+        _mark_unavailable(e)
+
+
+async def cache_delete(*keys: str):
+    """Drop cached values, e.g. after the underlying rows change."""
+    client = get_redis()
+    if client is None or not keys:
+        return
+    try:
+        await client.delete(*keys)
+    except Exception as e:
+        _mark_unavailable(e)
+
+
+async def close_redis():
+    """Close the shared Redis client."""
+    global _redis_client
+    if _redis_client is not None:
+        await _redis_client.aclose()
+        _redis_client = None
@@ -3,257 +3,425 @@ Database setup and connection management.
 """
 
 from sqlalchemy import create_engine
-from sqlalchemy.ext.asyncio import AsyncSession, create_async_engine
-from sqlalchemy.orm import sessionmaker, Session
-from sqlalchemy.pool import StaticPool
+from sqlalchemy.engine import Engine
+from sqlalchemy.orm import scoped_session, sessionmaker, Session
+from sqlalchemy.pool import NullPool, StaticPool
 import asyncio
-from typing import AsyncGenerator
+import threading
+from contextvars import ContextVar, Token
+from datetime import datetime, timedelta
+from functools import lru_cache
+from typing import TYPE_CHECKING, Any, AsyncGenerator, Dict, List, Optional
+from urllib.parse import urlsplit
+from uuid import uuid4
+
+if TYPE_CHECKING:
+    # Only needed for annotations; the asyncio extension is imported on first use
+    from sqlalchemy.ext.asyncio import AsyncEngine, AsyncSession, async_sessionmaker
 
 from .config import settings
 from .models import Base
-import os
 
 
 # Supabase Configuration
 # Priority: SUPABASE_DATABASE_URL > DATABASE_URL
-SUPABASE_DATABASE_URL = os.getenv("SUPABASE_DATABASE_URL")
+SUPABASE_DATABASE_URL = settings.SUPABASE_DATABASE_URL
 DATABASE_URL = SUPABASE_DATABASE_URL or settings.DATABASE_URL
 
+# Parse the URL once for diagnostics and pooler detection
+_url_parts = urlsplit(DATABASE_URL)
+DATABASE_SCHEME = _url_parts.scheme
+DATABASE_HOST = _url_parts.hostname or "unknown"
+IS_SQLITE = DATABASE_SCHEME.startswith("sqlite")
+IS_SUPABASE = "supabase.co" in DATABASE_URL
+
 # Display connection info
 if SUPABASE_DATABASE_URL:
-    db_info = DATABASE_URL.split('@')[1].split(':')[0] if '@' in DATABASE_URL else 'unknown'
-    print(f"🟢 Connected to Supabase PostgreSQL: {db_info}")
+    print(f"🟢 Connected to Supabase PostgreSQL: {DATABASE_HOST}")
 else:
-    print(f"🔵 Using database: {DATABASE_URL.split('://', 1)[0]}")
+    print(f"🔵 Using database: {DATABASE_SCHEME}")
 
-# Create database engines
-if DATABASE_URL.startswith("sqlite"):
-    # SQLite configuration
-    engine = create_engine(
-        DATABASE_URL,
-        connect_args={"check_same_thread": False},
-        poolclass=StaticPool,
-        echo=settings.DEBUG
-    )
-    async_engine = None  # SQLite doesn't support async in our setup
-else:
+# Supabase's PgBouncer pooler (transaction mode on port 6543) keeps pre-ping
+# SELECTs "idle in transaction", so pre-ping is off there by default
+IS_SUPABASE_POOLER = DATABASE_HOST.endswith("pooler.supabase.com") or ":6543" in _url_parts.netloc
+POOL_PRE_PING = (
+    settings.DB_POOL_PRE_PING
+    if settings.DB_POOL_PRE_PING is not None
+    else not IS_SUPABASE_POOLER
+)
+
+
+# SQLAlchemy compiled-SQL cache entries per engine (default is 500)
+SQL_COMPILED_CACHE_SIZE = 1200
+
+# Server-side prepared statements kept per asyncpg connection (default is 100)
+PREPARED_STATEMENT_CACHE_SIZE = 1024
+
+# Per-session PostgreSQL settings: JIT only adds planning time to the short
+# queries this app runs, and the timeouts bound runaway statements/transactions.
+# Sent as startup parameters on direct connections only: Supabase's PgBouncer
+# rejects unknown startup parameters. Behind the pooler, set them on the role
+# instead, e.g. ALTER ROLE postgres SET jit = off; ALTER ROLE postgres SET
+# statement_timeout = '30s'; ALTER ROLE postgres SET
+# idle_in_transaction_session_timeout = '60s';
+PG_SESSION_SETTINGS = {
+    "jit": "off",
+    "statement_timeout": "30000",
+    "idle_in_transaction_session_timeout": "60000",
+}
+
+
+def check_pool_budget():
+    """Warn when all workers' pools together can exceed the database connection cap."""
+    per_worker = settings.DB_POOL_SIZE + settings.DB_MAX_OVERFLOW
+    total = settings.WEB_CONCURRENCY * per_worker
+    if total > settings.DB_MAX_CONNECTIONS:
+        print(
+            f"⚠️ {settings.WEB_CONCURRENCY} workers x {per_worker} connections = {total} "
+            f"exceeds DB_MAX_CONNECTIONS ({settings.DB_MAX_CONNECTIONS}); "
+            "lower DB_POOL_SIZE/DB_MAX_OVERFLOW"
+        )
+
+
+# Supabase API configuration (for additional features)
+SUPABASE_URL = settings.SUPABASE_URL
+SUPABASE_ANON_KEY = settings.SUPABASE_ANON_KEY
+SUPABASE_SERVICE_ROLE_KEY = settings.SUPABASE_SERVICE_ROLE_KEY
+
+
+def get_pool_options() -> Dict[str, Any]:
+    """Connection pool arguments for PostgreSQL engines."""
+    if settings.DB_POOL_CLASS == "null":
+        # Serverless: the process may exit after one request, so don't keep
+        # idle connections counting against the Supabase cap
+        return {"poolclass": NullPool}
+    
+    check_pool_budget()
+    return {
+        "pool_pre_ping": POOL_PRE_PING,
+        "pool_size": settings.DB_POOL_SIZE,
+        "max_overflow": settings.DB_MAX_OVERFLOW,
+        "pool_timeout": settings.DB_POOL_TIMEOUT,
+        "pool_recycle": settings.DB_POOL_RECYCLE,
+    }
+
+
+# Engines and session makers are created on first use, so a process only
+# opens the pool it actually needs (request handlers use the sync engine)
+@lru_cache()
+def get_engine() -> Engine:
+    """Get the sync database engine (created on first call)."""
+    if IS_SQLITE:
+        # SQLite configuration
+        return create_engine(
+            DATABASE_URL,
+            connect_args={"check_same_thread": False},
+            poolclass=StaticPool,
+        )
+    
     # PostgreSQL/Supabase configuration with optimizations
-    sync_connect_args = {}
-    if "supabase.co" in DATABASE_URL:
-        sync_connect_args = {
+    # TCP keepalives let the OS reap dead connections without pre-ping
+    sync_connect_args = {
+        "keepalives": 1,
+        "keepalives_idle": 30,
+        "keepalives_interval": 10,
+        "keepalives_count": 5,
+    }
+    if not IS_SUPABASE_POOLER:
+        sync_connect_args["options"] = " ".join(
+            f"-c {name}={value}" for name, value in PG_SESSION_SETTINGS.items()
+        )
+    if IS_SUPABASE:
+        sync_connect_args.update({
             "sslmode": "require",
             "application_name": "eu-grants-monitor"
-        }
+        })
     
-    engine = create_engine(
+    # Bulk writes: INSERT executemany is batched into multi-row VALUES
+    # (insertmanyvalues, on by default in 2.x), and UPDATE/DELETE executemany
+    # goes through psycopg2's execute_batch instead of one round trip per row
+    return create_engine(
         DATABASE_URL,
-        pool_pre_ping=True,
-        pool_size=10,          # Optimized for Supabase
-        max_overflow=20,       # Handle connection spikes  
-        pool_recycle=1800,     # Recycle connections every 30 min
-        echo=settings.DEBUG,
+        query_cache_size=SQL_COMPILED_CACHE_SIZE,
+        use_insertmanyvalues=True,
+        executemany_mode="values_plus_batch",
+        **get_pool_options(),
         connect_args=sync_connect_args
     )
+
+
+@lru_cache()
+def get_async_engine() -> Optional["AsyncEngine"]:
+    """Get the async database engine, or None for SQLite (created on first call)."""
+    if IS_SQLITE:
+        return None  # SQLite doesn't support async in our setup
+    
+    from sqlalchemy.ext.asyncio import create_async_engine
     
     # Async engine for PostgreSQL/Supabase
     async_database_url = DATABASE_URL.replace("postgresql://", "postgresql+asyncpg://")
     
     # Add SSL configuration for Supabase
-    connect_args = {}
-    if "supabase.co" in DATABASE_URL:
-        connect_args = {
-            "ssl": "require",
-            "server_settings": {
-                "application_name": "eu-grants-monitor",
-            }
-        }
+    connect_args = {
+        "command_timeout": 60,
+        "server_settings": {} if IS_SUPABASE_POOLER else dict(PG_SESSION_SETTINGS),
+    }
+    if IS_SUPABASE:
+        connect_args["ssl"] = "require"
+        connect_args["server_settings"]["application_name"] = "eu-grants-monitor"
     
-    async_engine = create_async_engine(
+    if IS_SUPABASE_POOLER:
+        # PgBouncer transaction mode hands each transaction a different backend,
+        # so server-side prepared statements can't be cached or reused by name
+        connect_args.update({
+            "statement_cache_size": 0,
+            "prepared_statement_cache_size": 0,
+            "prepared_statement_name_func": lambda: f"__asyncpg_{uuid4()}__",
+        })
+    else:
+        # Direct connections keep their backend, so repeated queries skip
+        # parsing and planning
+        connect_args.update({
+            "statement_cache_size": PREPARED_STATEMENT_CACHE_SIZE,
+            "prepared_statement_cache_size": PREPARED_STATEMENT_CACHE_SIZE,
+        })
+    
+    return create_async_engine(
         async_database_url,
-        pool_pre_ping=True,
-        pool_size=10,
-        max_overflow=20,
-        pool_recycle=1800,
-        echo=settings.DEBUG,
+        query_cache_size=SQL_COMPILED_CACHE_SIZE,
+        **get_pool_options(),
         connect_args=connect_args
     )
 
-# Supabase API configuration (for additional features)
-SUPABASE_URL = os.getenv("SUPABASE_URL")
-SUPABASE_ANON_KEY = os.getenv("SUPABASE_ANON_KEY")
-SUPABASE_SERVICE_ROLE_KEY = os.getenv("SUPABASE_SERVICE_ROLE_KEY")
-
-# Create session makers
-SessionLocal = sessionmaker(
-    autocommit=False,
-    autoflush=False,
-    bind=engine
-)
 
-if async_engine:
-    AsyncSessionLocal = sessionmaker(
+@lru_cache()
+def get_session_factory() -> sessionmaker:
+    """Get the sync session maker bound to the sync engine."""
+    return sessionmaker(
+        autoflush=False,
+        expire_on_commit=False,  # serializing after commit shouldn't reload every row
+        bind=get_engine()
+    )
+
+
+# Request scope key for the scoped session; set per request by main.py middleware
+_request_scope: ContextVar[Optional[object]] = ContextVar("db_request_scope", default=None)
+
+
+def begin_request_scope() -> Token:
+    """Start a new database session scope for the current request."""
+    return _request_scope.set(object())
+
+
+def end_request_scope(token: Token) -> None:
+    """Restore the scope that was active before begin_request_scope()."""
+    _request_scope.reset(token)
+
+
+def _session_scope() -> Any:
+    """Scope key: the current request, or the current thread outside requests."""
+    scope = _request_scope.get()
+    return scope if scope is not None else threading.get_ident()
+
+
+@lru_cache()
+def get_scoped_session() -> scoped_session:
+    """Get the session registry that hands out one session per request."""
+    return scoped_session(get_session_factory(), scopefunc=_session_scope)
+
+
+@lru_cache()
+def get_async_session_factory() -> Optional["async_sessionmaker"]:
+    """Get the async session maker, or None when async is not configured."""
+    from sqlalchemy.ext.asyncio import async_sessionmaker
+    
+    async_engine = get_async_engine()
+    if async_engine is None:
+        return None
+    return async_sessionmaker(
         async_engine,
-        class_=AsyncSession,
-        expire_on_commit=False
+        expire_on_commit=False,
+        autoflush=False
     )
-else:
-    AsyncSessionLocal = None
+
+
+# Module attributes kept for existing imports (`from .database import engine`)
+_LAZY_ATTRIBUTES = {
+    "engine": get_engine,
+    "async_engine": get_async_engine,
+    "SessionLocal": get_session_factory,
+    "AsyncSessionLocal": get_async_session_factory,
+}
+
+
+def __getattr__(name: str):
+    """Resolve engines and session makers lazily on first attribute access."""
+    if name in _LAZY_ATTRIBUTES:
+        return _LAZY_ATTRIBUTES[name]()
+    raise AttributeError(f"module {__name__!r} has no attribute {name!r}")
 
 
 def get_db() -> Session:
     """
     Get database session for dependency injection.
     
+    Dependencies resolved within one request share the same session.
+    
     Yields:
         Session: SQLAlchemy database session
     """
-    db = SessionLocal()
+    db_session = get_scoped_session()
     try:
-        yield db
+        yield db_session()
     finally:
-        db.close()
+        db_session.remove()
 
 
-async def get_async_db() -> AsyncGenerator[AsyncSession, None]:
+async def get_async_db() -> AsyncGenerator["AsyncSession", None]:
     """
     Get async database session for dependency injection.
     
     Yields:
         AsyncSession: SQLAlchemy async database session
     """
-    if not AsyncSessionLocal:
+    async_session_factory = get_async_session_factory()
+    if not async_session_factory:
         raise RuntimeError("Async database sessions not configured")
     
-    async with AsyncSessionLocal() as session:
+    async with async_session_factory() as session:
         yield session
 
 
 async def create_tables():
     """Create all database tables."""
+    async_engine = get_async_engine()
     if async_engine:
         # Use async engine for PostgreSQL
         async with async_engine.begin() as conn:
             await conn.run_sync(Base.metadata.create_all)
     else:
         # Use sync engine for SQLite
-        Base.metadata.create_all(bind=engine)
+        Base.metadata.create_all(bind=get_engine())
 
 
 async def drop_tables():
     """Drop all database tables (for testing)."""
+    async_engine = get_async_engine()
     if async_engine:
         async with async_engine.begin() as conn:
             await conn.run_sync(Base.metadata.drop_all)
     else:
-        Base.metadata.drop_all(bind=engine)
+        Base.metadata.drop_all(bind=get_engine())
+
+
+def _sample_grants(now: datetime) -> List[Dict[str, Any]]:
+    """Sample grant rows (based on the existing mock data), dated relative to `now`."""
+    from .models import GrantStatus
+    
+    return [
+        dict(
+            grant_id="HE-2024-AI-001",
+            title="AI for Healthcare SMEs",
+            program="Horizon Europe",
+            description="This call supports Small and Medium Enterprises (SMEs) in developing artificial intelligence solutions for healthcare applications. Focus areas include machine learning for medical diagnosis, natural language processing for clinical documentation, and computer vision for medical imaging.",
+            synopsis="AI solutions for healthcare: ML diagnosis, NLP clinical docs, CV medical imaging",
+            total_budget=10000000,
+            min_funding_amount=50000,
+            max_funding_amount=500000,
+            deadline=now + timedelta(days=45),
+            project_start_date=now + timedelta(days=120),
+            project_end_date=now + timedelta(days=120 + 730),  # 2 years
+            project_duration_months=24,
+            eligible_countries=["DE", "FR", "IT", "ES", "NL", "BE", "AT", "SE", "DK", "FI"],
+            target_organizations=["SME", "Small Enterprise", "Medium Enterprise"],
+            keywords=["artificial intelligence", "healthcare", "machine learning", "medical diagnosis", "clinical validation"],
+            technology_areas=["AI", "Healthcare", "Machine Learning"],
+            industry_sectors=["Healthcare", "Technology"],
+            url="https://ec.europa.eu/info/funding-tenders/opportunities/portal/screen/opportunities/topic-details/HORIZON-EIC-2024-PATHFINDEROPEN-01",
+            documents_url="https://ec.europa.eu/info/funding-tenders/opportunities/documents",
+            status=GrantStatus.OPEN,
+            source_system="horizon_europe",
+            complexity_score=65.0
+        ),
+        dict(
+            grant_id="DIGITAL-EU-2024-002",
+            title="Digital Innovation for Manufacturing SMEs",
+            program="Digital Europe",
+            description="Supporting digital transformation in European manufacturing through Industry 4.0 technologies. This call targets SMEs developing solutions in areas such as IoT integration, predictive maintenance using AI, automated quality control, and supply chain optimization.",
+            synopsis="Industry 4.0: IoT, AI predictive maintenance, automated quality control",
+            total_budget=5000000,
+            min_funding_amount=75000,
+            max_funding_amount=300000,
+            deadline=now + timedelta(days=60),
+            project_start_date=now + timedelta(days=90),
+            project_end_date=now + timedelta(days=90 + 540),  # 18 months
+            project_duration_months=18,
+            eligible_countries=["DE", "FR", "IT", "ES", "PL", "CZ", "HU", "SK"],
+            target_organizations=["SME", "Manufacturing Company", "Technology Provider"],
+            keywords=["digital transformation", "industry 40", "iot", "predictive maintenance", "automation"],
+            technology_areas=["IoT", "AI", "Manufacturing"],
+            industry_sectors=["Manufacturing", "Technology"],
+            url="https://digital-strategy.ec.europa.eu/en/activities/digital-programme",
+            status=GrantStatus.OPEN,
+            source_system="digital_europe",
+            complexity_score=55.0
+        ),
+        dict(
+            grant_id="LIFE-2024-GREEN-004",
+            title="AI-Powered Environmental Monitoring Solutions",
+            program="Life",
+            description="Developing AI solutions for environmental monitoring and protection. Focus on satellite data analysis, IoT sensor networks, predictive environmental modeling, and automated reporting systems for environmental compliance.",
+            synopsis="Green AI: Satellite analysis, IoT sensors, environmental modeling",
+            total_budget=3000000,
+            min_funding_amount=100000,
+            max_funding_amount=400000,
+            deadline=now + timedelta(days=75),
+            project_start_date=now + timedelta(days=150),
+            project_end_date=now + timedelta(days=150 + 720),  # 2 years
+            project_duration_months=24,
+            eligible_countries=["DE", "FR", "IT", "ES", "NL", "BE", "AT", "SE", "DK", "FI", "PT", "GR"],
+            target_organizations=["SME", "Environmental Company", "Technology Provider"],
+            keywords=["environmental monitoring", "ai", "satellite data", "iot", "sustainability"],
+            technology_areas=["AI", "Environmental", "Satellite"],
+            industry_sectors=["Environment", "Technology", "Sustainability"],
+            url="https://ec.europa.eu/environment/life/",
+            status=GrantStatus.OPEN,
+            source_system="life_programme",
+            complexity_score=70.0
+        )
+    ]
 
 
 def init_db():
     """Initialize database with sample data."""
-    from .models import User, Company, Grant, CompanySize, GrantStatus
-    from datetime import datetime, timedelta
+    from .models import Grant
+    from sqlalchemy.dialects.postgresql import insert as pg_insert
+    from sqlalchemy.dialects.sqlite import insert as sqlite_insert
+    
+    # Create sample grants based on the existing mock data
+    sample_grants = _sample_grants(datetime.now())
+    dialect_insert = sqlite_insert if IS_SQLITE else pg_insert
     
-    db = SessionLocal()
     try:
-        # Check if we already have data
-        if db.query(Grant).first():
-            print("Database already has data, skipping initialization")
-            return
-        
-        # Create sample grants based on the existing mock data
-        sample_grants = [
-            Grant(
-                grant_id="HE-2024-AI-001",
-                title="AI for Healthcare SMEs",
-                program="Horizon Europe",
-                description="This call supports Small and Medium Enterprises (SMEs) in developing artificial intelligence solutions for healthcare applications. Focus areas include machine learning for medical diagnosis, natural language processing for clinical documentation, and computer vision for medical imaging.",
-                synopsis="AI solutions for healthcare: ML diagnosis, NLP clinical docs, CV medical imaging",
-                total_budget=10000000,
-                min_funding_amount=50000,
-                max_funding_amount=500000,
-                deadline=datetime.now() + timedelta(days=45),
-                project_start_date=datetime.now() + timedelta(days=120),
-                project_end_date=datetime.now() + timedelta(days=120 + 730),  # 2 years
-                project_duration_months=24,
-                eligible_countries=["DE", "FR", "IT", "ES", "NL", "BE", "AT", "SE", "DK", "FI"],
-                target_organizations=["SME", "Small Enterprise", "Medium Enterprise"],
-                keywords=["artificial intelligence", "healthcare", "machine learning", "medical diagnosis", "clinical validation"],
-                technology_areas=["AI", "Healthcare", "Machine Learning"],
-                industry_sectors=["Healthcare", "Technology"],
-                url="https://ec.europa.eu/info/funding-tenders/opportunities/portal/screen/opportunities/topic-details/HORIZON-EIC-2024-PATHFINDEROPEN-01",
-                documents_url="https://ec.europa.eu/info/funding-tenders/opportunities/documents",
-                status=GrantStatus.OPEN,
-                source_system="horizon_europe",
-                complexity_score=65.0
-            ),
-            Grant(
-                grant_id="DIGITAL-EU-2024-002",
-                title="Digital Innovation for Manufacturing SMEs",
-                program="Digital Europe",
-                description="Supporting digital transformation in European manufacturing through Industry 4.0 technologies. This call targets SMEs developing solutions in areas such as IoT integration, predictive maintenance using AI, automated quality control, and supply chain optimization.",
-                synopsis="Industry 4.0: IoT, AI predictive maintenance, automated quality control",
-                total_budget=5000000,
-                min_funding_amount=75000,
-                max_funding_amount=300000,
-                deadline=datetime.now() + timedelta(days=60),
-                project_start_date=datetime.now() + timedelta(days=90),
-                project_end_date=datetime.now() + timedelta(days=90 + 540),  # 18 months
-                project_duration_months=18,
-                eligible_countries=["DE", "FR", "IT", "ES", "PL", "CZ", "HU", "SK"],
-                target_organizations=["SME", "Manufacturing Company", "Technology Provider"],
-                keywords=["digital transformation", "industry 40", "iot", "predictive maintenance", "automation"],
-                technology_areas=["IoT", "AI", "Manufacturing"],
-                industry_sectors=["Manufacturing", "Technology"],
-                url="https://digital-strategy.ec.europa.eu/en/activities/digital-programme",
-                status=GrantStatus.OPEN,
-                source_system="digital_europe",
-                complexity_score=55.0
-            ),
-            Grant(
-                grant_id="LIFE-2024-GREEN-004",
-                title="AI-Powered Environmental Monitoring Solutions",
-                program="Life",
-                description="Developing AI solutions for environmental monitoring and protection. Focus on satellite data analysis, IoT sensor networks, predictive environmental modeling, and automated reporting systems for environmental compliance.",
-                synopsis="Green AI: Satellite analysis, IoT sensors, environmental modeling",
-                total_budget=3000000,
-                min_funding_amount=100000,
-                max_funding_amount=400000,
-                deadline=datetime.now() + timedelta(days=75),
-                project_start_date=datetime.now() + timedelta(days=150),
-                project_end_date=datetime.now() + timedelta(days=150 + 720),  # 2 years
-                project_duration_months=24,
-                eligible_countries=["DE", "FR", "IT", "ES", "NL", "BE", "AT", "SE", "DK", "FI", "PT", "GR"],
-                target_organizations=["SME", "Environmental Company", "Technology Provider"],
-                keywords=["environmental monitoring", "ai", "satellite data", "iot", "sustainability"],
-                technology_areas=["AI", "Environmental", "Satellite"],
-                industry_sectors=["Environment", "Technology", "Sustainability"],
-                url="https://ec.europa.eu/environment/life/",
-                status=GrantStatus.OPEN,
-                source_system="life_programme",
-                complexity_score=70.0
+        # One transaction, one multi-row INSERT; grants that already exist are left untouched
+        with get_session_factory()() as db, db.begin():
+            db.execute(
+                dialect_insert(Grant).on_conflict_do_nothing(index_elements=["grant_id"]),
+                sample_grants
             )
-        ]
-        
-        for grant in sample_grants:
-            db.add(grant)
-        
-        db.commit()
-        print(f"✅ Initialized database with {len(sample_grants)} sample grants")
+        print(f"✅ Initialized database with {len(sample_grants)} sample grants (existing grants skipped)")
         
     except Exception as e:
         print(f"❌ Error initializing database: {e}")
-        db.rollback()
-    finally:
-        db.close()
 
 
 def reset_db():
     """Reset database for development/testing."""
     print("🗑️ Dropping all tables...")
-    Base.metadata.drop_all(bind=engine)
+    Base.metadata.drop_all(bind=get_engine())
     
     print("🏗️ Creating tables...")
-    Base.metadata.create_all(bind=engine)
+    Base.metadata.create_all(bind=get_engine())
     
     print("📊 Initializing sample data...")
     init_db()
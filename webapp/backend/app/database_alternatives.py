@@ -8,11 +8,10 @@ This file shows how to configure the application for:
 """
 
 from sqlalchemy import create_engine, Text, String
-from sqlalchemy.ext.asyncio import AsyncSession, create_async_engine
 from sqlalchemy.orm import sessionmaker, Session
 from sqlalchemy.pool import StaticPool
-from sqlalchemy.dialects import mysql, postgresql
 import os
+from functools import lru_cache
 from typing import AsyncGenerator
 
 from .config import settings
@@ -45,15 +44,14 @@ def setup_supabase_database():
     engine = create_engine(
         supabase_url,
         pool_pre_ping=True,
-        echo=settings.DEBUG
     )
     
     # Async engine for Supabase
+    from sqlalchemy.ext.asyncio import create_async_engine
     async_supabase_url = supabase_url.replace("postgresql://", "postgresql+asyncpg://")
     async_engine = create_async_engine(
         async_supabase_url,
         pool_pre_ping=True,
-        echo=settings.DEBUG
     )
     
     return engine, async_engine
@@ -84,7 +82,6 @@ def setup_mysql_database():
     engine = create_engine(
         mysql_url,
         pool_pre_ping=True,
-        echo=settings.DEBUG,
         # MySQL-specific settings
         pool_size=20,
         max_overflow=0,
@@ -123,7 +120,6 @@ def setup_sqlite_database():
         sqlite_url,
         connect_args={"check_same_thread": False},
         poolclass=StaticPool,
-        echo=settings.DEBUG
     )
     
     # SQLite doesn't support async in our setup
@@ -136,32 +132,54 @@ def setup_sqlite_database():
 # MODEL ADAPTATIONS FOR DIFFERENT DATABASES
 # =============================================================================
 
+def _detect_kind(database_url: str) -> str:
+    """Classify a database URL as supabase, mysql, sqlite, postgresql or unknown."""
+    db_url = database_url.lower()
+    
+    if 'supabase.co' in db_url:
+        return "supabase"
+    elif 'mysql' in db_url:
+        return "mysql"
+    elif 'sqlite' in db_url:
+        return "sqlite"
+    elif 'postgresql' in db_url:
+        return "postgresql"
+    return "unknown"
+
+
+# Resolved once at import; the database URL doesn't change at runtime
+_DB_KIND = _detect_kind(settings.DATABASE_URL)
+_IS_PG = _DB_KIND in ("supabase", "postgresql")
+_IS_MYSQL = _DB_KIND == "mysql"
+_IS_SQLITE = _DB_KIND == "sqlite"
+
+
+@lru_cache(maxsize=1)
 def get_json_column_type():
     """
     Return appropriate JSON column type based on database.
     """
-    db_url = settings.DATABASE_URL.lower()
-    
-    if 'mysql' in db_url:
+    if _IS_MYSQL:
         # MySQL 5.7+ supports JSON, earlier versions need TEXT
+        from sqlalchemy.dialects import mysql
         return mysql.JSON()
-    elif 'sqlite' in db_url:
+    elif _IS_SQLITE:
         # SQLite stores JSON as TEXT
         return Text()
     else:
         # PostgreSQL (including Supabase)
+        from sqlalchemy.dialects import postgresql
         return postgresql.JSON()
 
 
+@lru_cache(maxsize=1)
 def get_array_column_type():
     """
     Handle array fields for different databases.
     
     PostgreSQL has native arrays, others need workarounds.
     """
-    db_url = settings.DATABASE_URL.lower()
-    
-    if 'postgresql' in db_url or 'supabase' in db_url:
+    if _IS_PG:
         # PostgreSQL native arrays
         from sqlalchemy.dialects.postgresql import ARRAY
         return ARRAY(String)
@@ -174,33 +192,32 @@ def get_array_column_type():
 # ENVIRONMENT-SPECIFIC SETUP
 # =============================================================================
 
+def _use_default_postgresql():
+    """Use the engines from the main database module."""
+    from .database import engine, async_engine
+    return engine, async_engine
+
+
+_ENGINE_SETUP = {
+    "supabase": ("🟢 Using Supabase (PostgreSQL-as-a-Service)", setup_supabase_database),
+    "mysql": ("🟡 Using MySQL", setup_mysql_database),
+    "sqlite": ("🔵 Using SQLite (Development)", setup_sqlite_database),
+    "postgresql": ("🟣 Using PostgreSQL", _use_default_postgresql),
+    "unknown": ("⚠️ Unknown database type, defaulting to SQLite", setup_sqlite_database),
+}
+
+
+@lru_cache(maxsize=1)
 def get_database_engines():
     """
     Get database engines based on environment configuration.
-    """
-    db_url = settings.DATABASE_URL.lower()
-    
-    if 'supabase.co' in db_url:
-        print("🟢 Using Supabase (PostgreSQL-as-a-Service)")
-        return setup_supabase_database()
-    
-    elif 'mysql' in db_url:
-        print("🟡 Using MySQL")
-        return setup_mysql_database()
-    
-    elif 'sqlite' in db_url:
-        print("🔵 Using SQLite (Development)")
-        return setup_sqlite_database()
     
-    elif 'postgresql' in db_url:
-        print("🟣 Using PostgreSQL")
-        # Use original PostgreSQL setup
-        from .database import engine, async_engine
-        return engine, async_engine
-    
-    else:
-        print("⚠️ Unknown database type, defaulting to SQLite")
-        return setup_sqlite_database()
+    Cached so repeated callers share one pair of engines (and pools), and the
+    provider banner is printed once.
+    """
+    message, setup = _ENGINE_SETUP[_DB_KIND]
+    print(message)
+    return setup()
 
 
 # =============================================================================
@@ -2,18 +2,40 @@
 Grants API endpoints for search, filtering, and management.
 """
 
-from typing import List, Optional, Dict, Any
+from typing import List, Optional, Dict, Any, Tuple
 from fastapi import APIRouter, Depends, HTTPException, Query
-from sqlalchemy.orm import Session
-from sqlalchemy import and_, or_, desc
-from pydantic import BaseModel
-from datetime import datetime, date
+from fastapi.responses import ORJSONResponse
+from sqlalchemy.orm import Session, load_only
+from sqlalchemy import and_, or_, desc, func, select, tuple_
+from sqlalchemy.dialects.postgresql import array
+from pydantic import BaseModel, ConfigDict, TypeAdapter, field_validator
+from datetime import datetime, date, timedelta
+import asyncio
+import base64
+import binascii
+import hashlib
+import orjson
 
-from .database import get_db
+from .cache import cache_get, cache_set
+from .config import settings
+from .database import get_db, get_async_session_factory, IS_SQLITE
 from .models import Grant, User, GrantStatus
 from .auth import get_current_user, get_optional_current_user
 
-router = APIRouter()
+router = APIRouter(default_response_class=ORJSONResponse)
+
+# Filter options only change when grants are synced; bump the version when
+# the response shape changes
+FILTER_OPTIONS_CACHE_KEY = "filters:options:v1"
+FILTER_OPTIONS_CACHE_TTL = 300  # seconds
+
+# Popular listings/searches are served from Redis for a short while; grant
+# details change less often
+GRANT_LIST_CACHE_TTL = 60  # seconds
+GRANT_DETAIL_CACHE_TTL = 300  # seconds
+
+# Rows fetched per round trip when streaming a result page
+PAGE_FETCH_CHUNK = 50
 
 
 class GrantSearchRequest(BaseModel):
@@ -35,14 +57,13 @@ class GrantSearchRequest(BaseModel):
     sort_by: str = "deadline"  # deadline, funding_amount, complexity_score, relevance
 
 
-class GrantResponse(BaseModel):
-    """Grant response model."""
+class GrantSummaryResponse(BaseModel):
+    """Grant fields shown in list views (no full description)."""
     id: int
     grant_id: str
     title: str
     program: str
     synopsis: Optional[str]
-    description: str
     total_budget: int
     min_funding_amount: Optional[int]
     max_funding_amount: Optional[int]
@@ -59,17 +80,182 @@ class GrantResponse(BaseModel):
     complexity_score: Optional[float]
     created_at: datetime
     
-    class Config:
-        from_attributes = True
+    model_config = ConfigDict(from_attributes=True)
+    
+    @field_validator(
+        "eligible_countries", "target_organizations", "keywords",
+        "technology_areas", "industry_sectors", mode="before"
+    )
+    @classmethod
+    def _none_as_empty_list(cls, value):
+        """Treat NULL JSON arrays as empty lists."""
+        return [] if value is None else value
+
+
+class GrantResponse(GrantSummaryResponse):
+    """Grant response model."""
+    description: str
 
 
 class GrantListResponse(BaseModel):
     """Grant list response model."""
-    grants: List[GrantResponse]
+    grants: List[GrantSummaryResponse]
     total_count: int
     page: int
     limit: int
     total_pages: int
+    next_cursor: Optional[str] = None  # set for deadline-sorted listings with more results
+
+
+# Built once at import and validates a whole page in one call; only used in
+# DEBUG to check the plain-dict responses against the documented schema
+GRANT_SUMMARIES_ADAPTER = TypeAdapter(List[GrantSummaryResponse])
+
+
+# Columns loaded for list views; the description is only needed by get_grant
+GRANT_SUMMARY_COLUMNS = (
+    Grant.id, Grant.grant_id, Grant.title, Grant.program, Grant.synopsis,
+    Grant.total_budget, Grant.min_funding_amount, Grant.max_funding_amount,
+    Grant.deadline, Grant.eligible_countries, Grant.target_organizations,
+    Grant.keywords, Grant.technology_areas, Grant.industry_sectors,
+    Grant.url, Grant.documents_url, Grant.status, Grant.complexity_score,
+    Grant.created_at,
+)
+
+
+def grant_summary(grant: Grant) -> Dict[str, Any]:
+    """Plain-dict GrantSummaryResponse for orjson, skipping per-row model validation."""
+    return {
+        "id": grant.id,
+        "grant_id": grant.grant_id,
+        "title": grant.title,
+        "program": grant.program,
+        "synopsis": grant.synopsis,
+        "total_budget": grant.total_budget,
+        "min_funding_amount": grant.min_funding_amount,
+        "max_funding_amount": grant.max_funding_amount,
+        "deadline": grant.deadline,
+        "days_until_deadline": grant.days_until_deadline,
+        "eligible_countries": grant.eligible_countries or [],
+        "target_organizations": grant.target_organizations or [],
+        "keywords": grant.keywords or [],
+        "technology_areas": grant.technology_areas or [],
+        "industry_sectors": grant.industry_sectors or [],
+        "url": grant.url,
+        "documents_url": grant.documents_url,
+        "status": grant.status,
+        "complexity_score": grant.complexity_score,
+        "created_at": grant.created_at,
+    }
+
+
+def encode_cursor(grant: Dict[str, Any]) -> str:
+    """Encode a grant's (deadline, id) position as an opaque keyset cursor."""
+    position = f"{grant['deadline'].isoformat()}|{grant['id']}"
+    return base64.urlsafe_b64encode(position.encode()).decode()
+
+
+def decode_cursor(cursor: str) -> Tuple[datetime, int]:
+    """Decode a keyset cursor back to its (deadline, id) position."""
+    try:
+        deadline, grant_id = base64.urlsafe_b64decode(cursor.encode()).decode().split("|")
+        return datetime.fromisoformat(deadline), int(grant_id)
+    except (binascii.Error, UnicodeDecodeError, ValueError):
+        raise HTTPException(status_code=400, detail="Invalid cursor")
+
+
+def response_cache_key(prefix: str, params: Dict[str, Any]) -> str:
+    """Build a stable cache key from normalized request parameters."""
+    digest = hashlib.blake2b(
+        orjson.dumps(params, option=orjson.OPT_SORT_KEYS), digest_size=16
+    ).hexdigest()
+    return f"{prefix}:{digest}"
+
+
+def text_search_filter(query: str):
+    """Match grants against a free-text query across title, synopsis and description."""
+    if IS_SQLITE:
+        # No full-text search on SQLite; fall back to substring matching
+        return or_(
+            Grant.title.icontains(query, autoescape=True),
+            Grant.description.icontains(query, autoescape=True),
+            Grant.synopsis.icontains(query, autoescape=True)
+        )
+    # Served by the GIN index on the generated search_vector column
+    return Grant.search_vector.op("@@")(func.plainto_tsquery("english", query))
+
+
+def text_search_rank(query: str):
+    """Relevance of a grant to a free-text query, or None where it can't be ranked."""
+    if IS_SQLITE:
+        return None
+    return func.ts_rank(Grant.search_vector, func.plainto_tsquery("english", query))
+
+
+def any_overlap(column, values: List[str]):
+    """Match grants whose JSON array column shares at least one element with values."""
+    if IS_SQLITE:
+        # No jsonb operators or array literals on SQLite
+        return or_(*(column.contains([value]) for value in values))
+    # jsonb ?| is a single GIN index probe, unlike one @> per value
+    return column.has_any(array(values))
+
+
+def distinct_array_values(db: Session, column) -> List[str]:
+    """Sorted distinct elements of a JSON array column (SQLite fallback)."""
+    # No jsonb functions on SQLite; flatten in Python instead
+    values = set()
+    for (items,) in db.query(column).filter(column.is_not(None)):
+        if items:
+            values.update(items)
+    return sorted(values)
+
+
+def distinct_array_values_stmt(column):
+    """SELECT the sorted distinct elements of a jsonb array column across all grants."""
+    element = func.jsonb_array_elements_text(column).label("value")
+    return (
+        select(element)
+        .where(func.jsonb_typeof(column) == "array")
+        .distinct()
+        .order_by(element)
+    )
+
+
+async def fetch_scalars(stmt) -> List[Any]:
+    """Run a statement on its own async session so several can run concurrently."""
+    async with get_async_session_factory()() as session:
+        return (await session.execute(stmt)).scalars().all()
+
+
+def fetch_page(query_builder, offset: int, limit: int) -> Tuple[List[Dict[str, Any]], int]:
+    """Fetch one page of grant summaries and the total match count in a single query."""
+    result = (
+        query_builder
+        .add_columns(
+            Grant.days_until_deadline.label("days_until_deadline"),
+            func.count().over().label("total_count")
+        )
+        .offset(offset)
+        .limit(limit)
+        .yield_per(PAGE_FETCH_CHUNK)
+    )
+    
+    # Rows arrive in chunks from a server-side cursor and are converted to
+    # dicts as they come, so ORM instances don't pile up for the whole page
+    grants = []
+    total_count = 0
+    for grant, days_until_deadline, total_count in result:
+        grant.days_until_deadline = days_until_deadline
+        grants.append(grant_summary(grant))
+    if settings.DEBUG:
+        GRANT_SUMMARIES_ADAPTER.validate_python(grants)
+    if grants:
+        return grants, total_count
+    
+    # Past the last page there is no row to carry the count
+    total_count = query_builder.order_by(None).count() if offset else 0
+    return [], total_count
 
 
 @router.get("/", response_model=GrantListResponse)
@@ -86,26 +272,41 @@ async def list_grants(
     page: int = Query(1, ge=1, description="Page number"),
     limit: int = Query(20, ge=1, le=100, description="Items per page"),
     sort_by: str = Query("deadline", description="Sort by field"),
+    cursor: Optional[str] = Query(None, description="Keyset cursor from a previous page (deadline sort only)"),
     db: Session = Depends(get_db),
     current_user: Optional[User] = Depends(get_optional_current_user)
 ):
-    """List grants with optional filtering and search."""
+    """
+    List grants with optional filtering and search.
+    
+    Deadline-sorted listings return a next_cursor; passing it back as cursor
+    continues after the last grant without an OFFSET scan. In cursor mode,
+    page is ignored and total_count counts the grants from the cursor on.
+    """
+    key = response_cache_key("grants:list", {
+        "query": query, "program": program, "country": country,
+        "min_funding": min_funding, "max_funding": max_funding,
+        "max_complexity": max_complexity, "technology_area": technology_area,
+        "industry_sector": industry_sector, "status": status, "page": page,
+        "limit": limit, "sort_by": sort_by, "cursor": cursor,
+    })
+    cached = await cache_get(key)
+    if cached is not None:
+        return ORJSONResponse(cached)
     
     # Base query
-    query_builder = db.query(Grant).filter(Grant.status == status)
+    query_builder = (
+        db.query(Grant)
+        .options(load_only(*GRANT_SUMMARY_COLUMNS))
+        .filter(Grant.status == status)
+    )
     
     # Apply filters
     if query:
-        # Simple text search in title, description, and keywords
-        search_filter = or_(
-            Grant.title.ilike(f"%{query}%"),
-            Grant.description.ilike(f"%{query}%"),
-            Grant.synopsis.ilike(f"%{query}%")
-        )
-        query_builder = query_builder.filter(search_filter)
+        query_builder = query_builder.filter(text_search_filter(query))
     
     if program:
-        query_builder = query_builder.filter(Grant.program.ilike(f"%{program}%"))
+        query_builder = query_builder.filter(Grant.program.icontains(program, autoescape=True))
     
     if country:
         query_builder = query_builder.filter(Grant.eligible_countries.contains([country]))
@@ -131,61 +332,53 @@ async def list_grants(
     if industry_sector:
         query_builder = query_builder.filter(Grant.industry_sectors.contains([industry_sector]))
     
-    # Get total count before pagination
-    total_count = query_builder.count()
-    
-    # Apply sorting
-    if sort_by == "deadline":
-        query_builder = query_builder.order_by(Grant.deadline)
+    # Apply sorting (deadline order is tie-broken on id so it can be keyset-paginated)
+    sort_by_deadline = sort_by not in ("funding_amount", "complexity_score", "created_at")
+    if sort_by_deadline:
+        query_builder = query_builder.order_by(Grant.deadline, Grant.id)
     elif sort_by == "funding_amount":
         query_builder = query_builder.order_by(desc(Grant.total_budget))
     elif sort_by == "complexity_score":
         query_builder = query_builder.order_by(Grant.complexity_score.nulls_last())
-    elif sort_by == "created_at":
-        query_builder = query_builder.order_by(desc(Grant.created_at))
     else:
-        query_builder = query_builder.order_by(Grant.deadline)
+        query_builder = query_builder.order_by(desc(Grant.created_at))
     
     # Apply pagination
+    if cursor:
+        if not sort_by_deadline:
+            raise HTTPException(status_code=400, detail="Cursor pagination requires sort_by=deadline")
+        query_builder = query_builder.filter(
+            tuple_(Grant.deadline, Grant.id) > tuple_(*decode_cursor(cursor))
+        )
+        page = 1
     offset = (page - 1) * limit
-    grants = query_builder.offset(offset).limit(limit).all()
-    
-    # Calculate days until deadline for each grant
-    grant_responses = []
-    for grant in grants:
-        grant_dict = {
-            "id": grant.id,
-            "grant_id": grant.grant_id,
-            "title": grant.title,
-            "program": grant.program,
-            "synopsis": grant.synopsis,
-            "description": grant.description,
-            "total_budget": grant.total_budget,
-            "min_funding_amount": grant.min_funding_amount,
-            "max_funding_amount": grant.max_funding_amount,
-            "deadline": grant.deadline,
-            "days_until_deadline": grant.days_until_deadline,
-            "eligible_countries": grant.eligible_countries or [],
-            "target_organizations": grant.target_organizations or [],
-            "keywords": grant.keywords or [],
-            "technology_areas": grant.technology_areas or [],
-            "industry_sectors": grant.industry_sectors or [],
-            "url": grant.url,
-            "documents_url": grant.documents_url,
-            "status": grant.status,
-            "complexity_score": grant.complexity_score,
-            "created_at": grant.created_at
-        }
-        grant_responses.append(GrantResponse(**grant_dict))
+    grants, total_count = fetch_page(query_builder, offset, limit)
     
     total_pages = (total_count + limit - 1) // limit
-    
-    return GrantListResponse(
-        grants=grant_responses,
-        total_count=total_count,
-        page=page,
-        limit=limit,
-        total_pages=total_pages
+    has_more = offset + len(grants) < total_count
+    
+    # Plain dicts serialized by orjson; GrantListResponse documents the shape
+    response = {
+        "grants": grants,
+        "total_count": total_count,
+        "page": page,
+        "limit": limit,
+        "total_pages": total_pages,
+        "next_cursor": encode_cursor(grants[-1]) if sort_by_deadline and has_more else None,
+    }
+    await cache_set(key, response, GRANT_LIST_CACHE_TTL)
+    return ORJSONResponse(response)
+
+
+# Sort orders search_grants understands; anything else sorts by deadline
+SEARCH_SORTS = ("deadline", "funding_amount", "complexity_score")
+
+
+def has_search_filters(search_request: GrantSearchRequest) -> bool:
+    """Whether the search narrows results beyond paging and sorting."""
+    return any(
+        value for field, value in search_request
+        if field not in ("page", "limit", "sort_by")
     )
 
 
@@ -196,26 +389,40 @@ async def search_grants(
     current_user: Optional[User] = Depends(get_optional_current_user)
 ):
     """Advanced grant search with multiple filters."""
+    if not has_search_filters(search_request):
+        # Plain paging through open grants: answer it as a listing
+        return await list_grants(
+            query=None, program=None, country=None, min_funding=None,
+            max_funding=None, max_complexity=None, technology_area=None,
+            industry_sector=None, status=GrantStatus.OPEN,
+            page=search_request.page, limit=search_request.limit,
+            sort_by=search_request.sort_by if search_request.sort_by in SEARCH_SORTS else "deadline",
+            cursor=None, db=db, current_user=current_user
+        )
+    
+    key = response_cache_key("grants:search", search_request.model_dump(mode="json"))
+    cached = await cache_get(key)
+    if cached is not None:
+        return ORJSONResponse(cached)
     
     # Base query
-    query_builder = db.query(Grant).filter(Grant.status == GrantStatus.OPEN)
+    query_builder = (
+        db.query(Grant)
+        .options(load_only(*GRANT_SUMMARY_COLUMNS))
+        .filter(Grant.status == GrantStatus.OPEN)
+    )
     
     # Apply search query
     if search_request.query:
-        search_filter = or_(
-            Grant.title.ilike(f"%{search_request.query}%"),
-            Grant.description.ilike(f"%{search_request.query}%"),
-            Grant.synopsis.ilike(f"%{search_request.query}%")
-        )
-        query_builder = query_builder.filter(search_filter)
+        query_builder = query_builder.filter(text_search_filter(search_request.query))
     
     # Apply keyword filters
     if search_request.keywords:
         for keyword in search_request.keywords:
             keyword_filter = or_(
                 Grant.keywords.contains([keyword]),
-                Grant.title.ilike(f"%{keyword}%"),
-                Grant.description.ilike(f"%{keyword}%")
+                Grant.title.icontains(keyword, autoescape=True),
+                Grant.description.icontains(keyword, autoescape=True)
             )
             query_builder = query_builder.filter(keyword_filter)
     
@@ -225,10 +432,9 @@ async def search_grants(
     
     # Apply country filters
     if search_request.countries:
-        country_filters = []
-        for country in search_request.countries:
-            country_filters.append(Grant.eligible_countries.contains([country]))
-        query_builder = query_builder.filter(or_(*country_filters))
+        query_builder = query_builder.filter(
+            any_overlap(Grant.eligible_countries, search_request.countries)
+        )
     
     # Apply funding amount filters
     if search_request.min_funding:
@@ -261,30 +467,27 @@ async def search_grants(
     
     # Apply technology area filters
     if search_request.technology_areas:
-        tech_filters = []
-        for tech_area in search_request.technology_areas:
-            tech_filters.append(Grant.technology_areas.contains([tech_area]))
-        query_builder = query_builder.filter(or_(*tech_filters))
+        query_builder = query_builder.filter(
+            any_overlap(Grant.technology_areas, search_request.technology_areas)
+        )
     
     # Apply industry sector filters
     if search_request.industry_sectors:
-        industry_filters = []
-        for industry in search_request.industry_sectors:
-            industry_filters.append(Grant.industry_sectors.contains([industry]))
-        query_builder = query_builder.filter(or_(*industry_filters))
+        query_builder = query_builder.filter(
+            any_overlap(Grant.industry_sectors, search_request.industry_sectors)
+        )
     
     # Apply target organization filters
     if search_request.target_organizations:
-        org_filters = []
-        for org_type in search_request.target_organizations:
-            org_filters.append(Grant.target_organizations.contains([org_type]))
-        query_builder = query_builder.filter(or_(*org_filters))
-    
-    # Get total count
-    total_count = query_builder.count()
+        query_builder = query_builder.filter(
+            any_overlap(Grant.target_organizations, search_request.target_organizations)
+        )
     
-    # Apply sorting
-    if search_request.sort_by == "deadline":
+    # Apply sorting (relevance needs a text query to rank against)
+    rank = text_search_rank(search_request.query) if search_request.query else None
+    if search_request.sort_by == "relevance" and rank is not None:
+        query_builder = query_builder.order_by(desc(rank), Grant.id)
+    elif search_request.sort_by == "deadline":
         query_builder = query_builder.order_by(Grant.deadline)
     elif search_request.sort_by == "funding_amount":
         query_builder = query_builder.order_by(desc(Grant.total_budget))
@@ -295,45 +498,20 @@ async def search_grants(
     
     # Apply pagination
     offset = (search_request.page - 1) * search_request.limit
-    grants = query_builder.offset(offset).limit(search_request.limit).all()
-    
-    # Convert to response format
-    grant_responses = []
-    for grant in grants:
-        grant_dict = {
-            "id": grant.id,
-            "grant_id": grant.grant_id,
-            "title": grant.title,
-            "program": grant.program,
-            "synopsis": grant.synopsis,
-            "description": grant.description,
-            "total_budget": grant.total_budget,
-            "min_funding_amount": grant.min_funding_amount,
-            "max_funding_amount": grant.max_funding_amount,
-            "deadline": grant.deadline,
-            "days_until_deadline": grant.days_until_deadline,
-            "eligible_countries": grant.eligible_countries or [],
-            "target_organizations": grant.target_organizations or [],
-            "keywords": grant.keywords or [],
-            "technology_areas": grant.technology_areas or [],
-            "industry_sectors": grant.industry_sectors or [],
-            "url": grant.url,
-            "documents_url": grant.documents_url,
-            "status": grant.status,
-            "complexity_score": grant.complexity_score,
-            "created_at": grant.created_at
-        }
-        grant_responses.append(GrantResponse(**grant_dict))
+    grants, total_count = fetch_page(query_builder, offset, search_request.limit)
     
     total_pages = (total_count + search_request.limit - 1) // search_request.limit
     
-    return GrantListResponse(
-        grants=grant_responses,
-        total_count=total_count,
-        page=search_request.page,
-        limit=search_request.limit,
-        total_pages=total_pages
-    )
+    response = {
+        "grants": grants,
+        "total_count": total_count,
+        "page": search_request.page,
+        "limit": search_request.limit,
+        "total_pages": total_pages,
+        "next_cursor": None,
+    }
+    await cache_set(key, response, GRANT_LIST_CACHE_TTL)
+    return ORJSONResponse(response)
 
 
 @router.get("/{grant_id}", response_model=GrantResponse)
@@ -343,76 +521,54 @@ async def get_grant(
     current_user: Optional[User] = Depends(get_optional_current_user)
 ):
     """Get detailed information about a specific grant."""
+    key = f"grants:detail:{grant_id}"
+    cached = await cache_get(key)
+    if cached is not None:
+        return ORJSONResponse(cached)
     
     grant = db.query(Grant).filter(Grant.grant_id == grant_id).first()
     if not grant:
         raise HTTPException(status_code=404, detail="Grant not found")
     
-    grant_dict = {
-        "id": grant.id,
-        "grant_id": grant.grant_id,
-        "title": grant.title,
-        "program": grant.program,
-        "synopsis": grant.synopsis,
-        "description": grant.description,
-        "total_budget": grant.total_budget,
-        "min_funding_amount": grant.min_funding_amount,
-        "max_funding_amount": grant.max_funding_amount,
-        "deadline": grant.deadline,
-        "days_until_deadline": grant.days_until_deadline,
-        "eligible_countries": grant.eligible_countries or [],
-        "target_organizations": grant.target_organizations or [],
-        "keywords": grant.keywords or [],
-        "technology_areas": grant.technology_areas or [],
-        "industry_sectors": grant.industry_sectors or [],
-        "url": grant.url,
-        "documents_url": grant.documents_url,
-        "status": grant.status,
-        "complexity_score": grant.complexity_score,
-        "created_at": grant.created_at
-    }
-    
-    return GrantResponse(**grant_dict)
+    response = grant_summary(grant)
+    response["description"] = grant.description
+    await cache_set(key, response, GRANT_DETAIL_CACHE_TTL)
+    return ORJSONResponse(response)
 
 
 @router.get("/filters/options")
 async def get_filter_options(db: Session = Depends(get_db)):
     """Get available filter options for grant search."""
+    cached = await cache_get(FILTER_OPTIONS_CACHE_KEY)
+    if cached is not None:
+        return cached
+    
+    # Get unique values for various filter fields (deduplicated by the database)
+    programs_stmt = select(Grant.program).where(Grant.program.is_not(None)).distinct().order_by(Grant.program)
+    array_columns = (
+        Grant.eligible_countries, Grant.technology_areas,
+        Grant.industry_sectors, Grant.target_organizations,
+    )
+    if IS_SQLITE:
+        programs = db.execute(programs_stmt).scalars().all()
+        countries, technology_areas, industry_sectors, target_organizations = (
+            distinct_array_values(db, column) for column in array_columns
+        )
+    else:
+        # Independent queries, each on its own connection
+        programs, countries, technology_areas, industry_sectors, target_organizations = (
+            await asyncio.gather(
+                fetch_scalars(programs_stmt),
+                *(fetch_scalars(distinct_array_values_stmt(column)) for column in array_columns)
+            )
+        )
     
-    # Get unique values for various filter fields
-    programs = db.query(Grant.program).distinct().all()
-    countries = db.query(Grant.eligible_countries).filter(Grant.eligible_countries.is_not(None)).all()
-    technology_areas = db.query(Grant.technology_areas).filter(Grant.technology_areas.is_not(None)).all()
-    industry_sectors = db.query(Grant.industry_sectors).filter(Grant.industry_sectors.is_not(None)).all()
-    target_organizations = db.query(Grant.target_organizations).filter(Grant.target_organizations.is_not(None)).all()
-    
-    # Flatten and deduplicate arrays
-    all_countries = set()
-    for row in countries:
-        if row[0]:
-            all_countries.update(row[0])
-    
-    all_tech_areas = set()
-    for row in technology_areas:
-        if row[0]:
-            all_tech_areas.update(row[0])
-    
-    all_industries = set()
-    for row in industry_sectors:
-        if row[0]:
-            all_industries.update(row[0])
-    
-    all_target_orgs = set()
-    for row in target_organizations:
-        if row[0]:
-            all_target_orgs.update(row[0])
-    
-    return {
-        "programs": sorted([p[0] for p in programs if p[0]]),
-        "countries": sorted(list(all_countries)),
-        "technology_areas": sorted(list(all_tech_areas)),
-        "industry_sectors": sorted(list(all_industries)),
-        "target_organizations": sorted(list(all_target_orgs)),
+    options = {
+        "programs": programs,
+        "countries": countries,
+        "technology_areas": technology_areas,
+        "industry_sectors": industry_sectors,
+        "target_organizations": target_organizations,
         "complexity_ranges": [
             {"label": "Low (0-40)", "min": 0, "max": 40},
             {"label": "Medium (41-70)", "min": 41, "max": 70},
@@ -425,3 +581,5 @@ async def get_filter_options(db: Session = Depends(get_db)):
             {"label": "€1M+", "min": 1000000, "max": None}
         ]
     }
+    await cache_set(FILTER_OPTIONS_CACHE_KEY, options, FILTER_OPTIONS_CACHE_TTL)
+    return options
@@ -12,22 +12,27 @@ from contextlib import asynccontextmanager
 from fastapi import FastAPI, Depends, HTTPException, Request
 from fastapi.middleware.cors import CORSMiddleware
 from fastapi.middleware.trustedhost import TrustedHostMiddleware
+from fastapi.responses import ORJSONResponse
 from fastapi.security import HTTPBearer
 from sqlalchemy.orm import Session
-import os
-from pathlib import Path
+import importlib
+import logging
 
-from .database import engine, get_db, create_tables
-from .models import Base
-from .auth import router as auth_router, get_current_user
+from .database import get_db, create_tables, begin_request_scope, end_request_scope
+from .auth import router as auth_router, get_current_user, close_oauth_client
 from .oauth_callbacks import router as oauth_router
-from .grants import router as grants_router
-from .simple_grants import router as simple_grants_router
 from .payments import router as payments_router
 from .users import router as users_router
 from .ai_assistant import router as ai_assistant_router
+from .cache import close_redis
 from .config import settings
 
+# SQL statement logging goes through the standard logging hierarchy instead
+# of engine echo, so handlers decide whether statements get formatted
+logging.getLogger("sqlalchemy.engine").setLevel(
+    logging.INFO if settings.DEBUG else logging.WARNING
+)
+
 
 @asynccontextmanager
 async def lifespan(app: FastAPI):
@@ -35,33 +40,14 @@ async def lifespan(app: FastAPI):
     # Startup
     print("🚀 Starting EU Grants Monitor Web Platform...")
     
-    # Run database migration for hashed_password column
-    try:
-        from .database import SessionLocal
-        from sqlalchemy import text
-        
-        with SessionLocal() as db:
-            # Check if column exists
-            result = db.execute(text("""
-                SELECT column_name 
-                FROM information_schema.columns 
-                WHERE table_name = 'users' AND column_name = 'hashed_password'
-            """))
-            
-            if result.fetchone():
-                print("✅ hashed_password column already exists")
-            else:
-                # Add the column
-                db.execute(text("""
-                    ALTER TABLE users 
-                    ADD COLUMN hashed_password VARCHAR(255) NULL
-                """))
-                db.commit()
-                print("✅ Successfully added hashed_password column")
-        
-        print("✅ Database migration completed")
-    except Exception as e:
-        print(f"⚠️ Database migration failed: {e}")
+    # Schema migrations (migration.py) run once per deploy as Railway's
+    # pre-deploy step, not on every worker boot
+    
+    # The simple grants API checks its database settings and builds its
+    # engine here, once, rather than on the request path. A missing, localhost
+    # or SQLite database only disables its routes (503) instead of the app
+    if settings.USE_SIMPLE_GRANTS and not grants_api.initialize_database():
+        print("⚠️ Simple grants API disabled: set SUPABASE_DATABASE_URL or DATABASE_URL to a PostgreSQL database")
     
     # Create database tables - Disabled since tables already exist via Supabase
     # await create_tables()
@@ -75,6 +61,8 @@ async def lifespan(app: FastAPI):
     
     # Shutdown
     print("👋 Shutting down EU Grants Monitor Web Platform...")
+    await close_oauth_client()
+    await close_redis()
 
 
 # Create FastAPI application
@@ -85,6 +73,7 @@ app = FastAPI(
     docs_url="/api/docs",
     redoc_url="/api/redoc",
     openapi_url="/api/openapi.json",
+    default_response_class=ORJSONResponse,
     lifespan=lifespan
 )
 
@@ -103,6 +92,16 @@ app.add_middleware(
     allow_headers=["*"],
 )
 
+
+@app.middleware("http")
+async def database_session_scope(request: Request, call_next):
+    """Give each request its own scoped database session."""
+    token = begin_request_scope()
+    try:
+        return await call_next(request)
+    finally:
+        end_request_scope(token)
+
 # Security scheme
 security = HTTPBearer()
 
@@ -110,8 +109,18 @@ security = HTTPBearer()
 app.include_router(auth_router, prefix="/api/auth", tags=["Authentication"])
 app.include_router(oauth_router, prefix="/api/auth", tags=["OAuth"])
 app.include_router(users_router, prefix="/api/users", tags=["Users"])
-# app.include_router(grants_router, prefix="/api/grants", tags=["Grants"])  # Disabled due to route conflict
-app.include_router(simple_grants_router, prefix="/api/grants", tags=["Grants - Simple"])
+# Only one grants implementation is mounted (they share /api/grants), so only
+# that module is imported
+if settings.USE_SIMPLE_GRANTS:
+    grants_module, grants_tags = ".simple_grants", ["Grants - Simple"]
+else:
+    grants_module, grants_tags = ".grants", ["Grants"]
+grants_api = importlib.import_module(grants_module, __package__)
+app.include_router(
+    grants_api.router,
+    prefix="/api/grants",
+    tags=grants_tags
+)
 app.include_router(payments_router, prefix="/api/payments", tags=["Payments"])
 app.include_router(ai_assistant_router, prefix="/api/ai-assistant", tags=["AI Assistant"])
 
@@ -161,21 +170,28 @@ async def get_current_user_info(
 @app.exception_handler(HTTPException)
 async def http_exception_handler(request: Request, exc: HTTPException):
     """Custom HTTP exception handler."""
-    return {
-        "error": True,
-        "message": exc.detail,
-        "status_code": exc.status_code
-    }
+    return ORJSONResponse(
+        status_code=exc.status_code,
+        content={
+            "error": True,
+            "message": exc.detail,
+            "status_code": exc.status_code
+        },
+        headers=exc.headers
+    )
 
 
 @app.exception_handler(Exception)
 async def general_exception_handler(request: Request, exc: Exception):
     """General exception handler."""
-    return {
-        "error": True,
-        "message": "An unexpected error occurred",
-        "status_code": 500
-    }
+    return ORJSONResponse(
+        status_code=500,
+        content={
+            "error": True,
+            "message": "An unexpected error occurred",
+            "status_code": 500
+        }
+    )
 
 
 if __name__ == "__main__":
@@ -184,5 +200,5 @@ if __name__ == "__main__":
         "app.main:app",
         host="0.0.0.0",
         port=8000,
-        reload=True if os.getenv("ENVIRONMENT") == "development" else False
+        reload=settings.ENVIRONMENT == "development"
     )
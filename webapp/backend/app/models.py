@@ -3,18 +3,86 @@ Database models for EU Grants Monitor Web Platform.
 """
 
 from sqlalchemy import (
-    Boolean, Column, DateTime, Enum, Float, ForeignKey, 
-    Integer, JSON, String, Text, UniqueConstraint
+    DDL, BigInteger, Boolean, Column, Computed, DateTime, Enum, ForeignKey, 
+    Identity, Index, Integer, JSON, Numeric, String, Text, UniqueConstraint, event, text
 )
+from sqlalchemy.dialects.postgresql import JSONB, TSVECTOR
+from sqlalchemy.ext.compiler import compiles
 from sqlalchemy.ext.declarative import declarative_base
+from sqlalchemy.ext.hybrid import hybrid_property
 from sqlalchemy.orm import relationship
 from sqlalchemy.sql import func
+from sqlalchemy.sql.expression import FunctionElement
 from datetime import datetime, date
 from typing import Optional, List, Dict, Any
 import enum
 
 Base = declarative_base()
 
+# Trigram operator classes for the substring-search indexes below
+event.listen(
+    Base.metadata,
+    "before_create",
+    DDL("CREATE EXTENSION IF NOT EXISTS pg_trgm").execute_if(dialect="postgresql")
+)
+
+
+# 64-bit keys so high-volume tables never hit the 32-bit ceiling; SQLite
+# only autoincrements INTEGER PRIMARY KEY, so it keeps plain Integer
+BigId = BigInteger().with_variant(Integer(), "sqlite")
+
+# Percentages and 0-100 scores: exact two-decimal NUMERIC(5,2) instead of
+# 8-byte floats, still handed to Python (and orjson) as float
+Percentage = Numeric(5, 2, asdecimal=False)
+
+# JSONB on PostgreSQL so array filters (@>, ?|) can use GIN indexes
+JSONArray = JSONB().with_variant(JSON(), "sqlite")
+
+# Columns filtered by membership in list_grants/search_grants
+GRANT_ARRAY_FILTER_COLUMNS = (
+    "eligible_countries", "target_organizations", "keywords",
+    "technology_areas", "industry_sectors",
+)
+
+# Text columns matched by substring (ILIKE '%...%') in the grants endpoints
+GRANT_TRIGRAM_COLUMNS = ("program", "title", "synopsis", "description")
+
+# Arrays only ever matched by containment (@>); jsonb_path_ops indexes are
+# smaller and faster for that but can't serve ?| like the filters above
+GRANT_CONTAINMENT_COLUMNS = ("topics",)
+COMPANY_CONTAINMENT_COLUMNS = ("ai_expertise", "technology_focus")
+
+
+# Full-text search document for grants, kept up to date by PostgreSQL
+GRANT_SEARCH_DOCUMENT = (
+    "to_tsvector('english', coalesce(title, '') || ' ' || "
+    "coalesce(synopsis, '') || ' ' || coalesce(description, ''))"
+)
+
+
+@compiles(Computed, "sqlite")
+def _skip_computed_on_sqlite(element, compiler, **kw):
+    """SQLite has no tsvector functions, so generated columns stay plain there."""
+    return ""
+
+
+class days_until(FunctionElement):
+    """Whole days from today until a timestamp (never negative), computed in SQL."""
+    type = Integer()
+    name = "days_until"
+    inherit_cache = True
+
+
+@compiles(days_until)
+def _days_until_postgresql(element, compiler, **kw):
+    return f"greatest(date({compiler.process(element.clauses, **kw)}) - current_date, 0)"
+
+
+@compiles(days_until, "sqlite")
+def _days_until_sqlite(element, compiler, **kw):
+    day = compiler.process(element.clauses, **kw)
+    return f"max(CAST(julianday(date({day})) - julianday(date('now')) AS INTEGER), 0)"
+
 
 class UserRole(str, enum.Enum):
     """User roles in the system."""
@@ -59,19 +127,39 @@ class ApplicationStatus(str, enum.Enum):
     WITHDRAWN = "withdrawn"
 
 
+class PaymentStatus(str, enum.Enum):
+    """Stripe payment transaction status."""
+    PENDING = "pending"
+    SUCCEEDED = "succeeded"
+    FAILED = "failed"
+    CANCELLED = "cancelled"
+
+
+class ProductType(str, enum.Enum):
+    """AI Assistant products that can be purchased."""
+    MONTHLY = "monthly"
+    YEARLY = "yearly"
+    PER_APPLICATION = "per_application"
+
+
+def enum_values(enum_class) -> list:
+    """Store an enum's values (not its member names) in the database."""
+    return [member.value for member in enum_class]
+
+
 class User(Base):
     """User account model."""
     __tablename__ = "users"
     
-    id = Column(Integer, primary_key=True, index=True)
-    email = Column(String(255), unique=True, index=True, nullable=False)
+    id = Column(BigId, Identity(), primary_key=True)
+    email = Column(String(255), unique=True, nullable=False)
     full_name = Column(String(255), nullable=False)
     profile_picture_url = Column(String(500))
     
     # Authentication
     hashed_password = Column(String(255), nullable=True)  # For email/password auth
-    google_id = Column(String(255), unique=True, nullable=True, index=True)
-    microsoft_id = Column(String(255), unique=True, nullable=True, index=True)
+    google_id = Column(String(255), unique=True, nullable=True)
+    microsoft_id = Column(String(255), unique=True, nullable=True)
     is_active = Column(Boolean, default=True)
     email_verified = Column(Boolean, default=False)
     
@@ -94,9 +182,21 @@ class User(Base):
     last_login = Column(DateTime)
     
     # Relationships
-    company_id = Column(Integer, ForeignKey("companies.id"), nullable=True)
-    company = relationship("Company", back_populates="users")
-    applications = relationship("Application", back_populates="user")
+    company_id = Column(BigId, ForeignKey("companies.id"), nullable=True)
+    # Loader strategies: single related rows (company) load on access, which
+    # is a cheap identity-map/PK lookup; collections are never lazy-loaded,
+    # so list endpoints have to selectinload them explicitly instead of
+    # issuing one SELECT per parent row. passive_deletes leaves child rows
+    # to the foreign keys rather than loading them on delete
+    company = relationship("Company", back_populates="users", lazy="select")
+    applications = relationship(
+        "Application", back_populates="user", lazy="raise", passive_deletes=True
+    )
+    
+    # Subscription sweeps filter active users by subscription status
+    __table_args__ = (
+        Index("idx_users_active_subscription", "is_active", "subscription_status"),
+    )
     
     def __repr__(self):
         return f"<User(email='{self.email}', role='{self.role}')>"
@@ -106,7 +206,7 @@ class Company(Base):
     """Company/Organization model."""
     __tablename__ = "companies"
     
-    id = Column(Integer, primary_key=True, index=True)
+    id = Column(BigId, Identity(), primary_key=True)
     name = Column(String(255), nullable=False, index=True)
     description = Column(Text)
     website = Column(String(255))
@@ -121,8 +221,8 @@ class Company(Base):
     registration_number = Column(String(50))
     
     # AI/Technology expertise (JSON array)
-    ai_expertise = Column(JSON, default=list)  # e.g., ["machine_learning", "nlp", "computer_vision"]
-    technology_focus = Column(JSON, default=list)  # e.g., ["healthcare", "fintech", "manufacturing"]
+    ai_expertise = Column(JSONArray, default=list)  # e.g., ["machine_learning", "nlp", "computer_vision"]
+    technology_focus = Column(JSONArray, default=list)  # e.g., ["healthcare", "fintech", "manufacturing"]
     
     # Financial information
     annual_revenue = Column(Integer)  # in euros
@@ -135,15 +235,25 @@ class Company(Base):
     
     # Company profile completion
     profile_completed = Column(Boolean, default=False)
-    profile_completion_percentage = Column(Float, default=0.0)
+    profile_completion_percentage = Column(Percentage, default=0.0)
     
     # Timestamps
     created_at = Column(DateTime(timezone=True), server_default=func.now())
     updated_at = Column(DateTime(timezone=True), onupdate=func.now())
     
-    # Relationships
-    users = relationship("User", back_populates="company")
-    applications = relationship("Application", back_populates="company")
+    # Relationships (collections must be loaded explicitly, see User)
+    users = relationship("User", back_populates="company", lazy="raise", passive_deletes=True)
+    applications = relationship(
+        "Application", back_populates="company", lazy="raise", passive_deletes=True
+    )
+    
+    __table_args__ = tuple(
+        Index(
+            f"idx_companies_{column}", column,
+            postgresql_using="gin", postgresql_ops={column: "jsonb_path_ops"}
+        ).ddl_if(dialect="postgresql")
+        for column in COMPANY_CONTAINMENT_COLUMNS
+    )
     
     def __repr__(self):
         return f"<Company(name='{self.name}', size='{self.size}')>"
@@ -153,10 +263,10 @@ class Grant(Base):
     """EU Grant opportunity model."""
     __tablename__ = "grants"
     
-    id = Column(Integer, primary_key=True, index=True)
-    grant_id = Column(String(255), unique=True, nullable=False, index=True)  # External ID
+    id = Column(BigId, Identity(), primary_key=True)
+    grant_id = Column(String(255), unique=True, nullable=False)  # External ID
     title = Column(String(500), nullable=False, index=True)
-    program = Column(String(100), nullable=False, index=True)  # e.g., "Horizon Europe"
+    program = Column(String(100), nullable=False)  # e.g., "Horizon Europe"
     
     # Grant content
     description = Column(Text, nullable=False)
@@ -165,7 +275,7 @@ class Grant(Base):
     
     # Financial information
     total_budget = Column(Integer, nullable=False)  # in euros
-    funding_rate = Column(Float, default=70.0)  # percentage
+    funding_rate = Column(Percentage, default=70.0)  # percentage
     min_funding_amount = Column(Integer)
     max_funding_amount = Column(Integer)
     
@@ -177,15 +287,15 @@ class Grant(Base):
     project_duration_months = Column(Integer)
     
     # Eligibility
-    eligible_countries = Column(JSON, default=list)  # ISO country codes
-    target_organizations = Column(JSON, default=list)  # SME, University, etc.
+    eligible_countries = Column(JSONArray, default=list)  # ISO country codes
+    target_organizations = Column(JSONArray, default=list)  # SME, University, etc.
     eligible_activities = Column(JSON, default=list)
     
     # Categorization
-    keywords = Column(JSON, default=list)
-    topics = Column(JSON, default=list)
-    technology_areas = Column(JSON, default=list)
-    industry_sectors = Column(JSON, default=list)
+    keywords = Column(JSONArray, default=list)
+    topics = Column(JSONArray, default=list)
+    technology_areas = Column(JSONArray, default=list)
+    industry_sectors = Column(JSONArray, default=list)
     
     # External links
     url = Column(String(500))
@@ -196,47 +306,100 @@ class Grant(Base):
     status = Column(Enum(GrantStatus), default=GrantStatus.OPEN)
     
     # AI analysis results
-    complexity_score = Column(Float)  # 0-100, higher = more complex
+    complexity_score = Column(Percentage)  # 0-100, higher = more complex
     ai_relevance_keywords = Column(JSON, default=list)
-    estimated_success_rate = Column(Float)
+    estimated_success_rate = Column(Percentage)
     
     # Data source tracking
     source_system = Column(String(100))  # "horizon_europe", "digital_europe", etc.
     source_url = Column(String(500))
-    last_updated = Column(DateTime, default=func.now())
+    last_updated = Column(DateTime(timezone=True), server_default=func.now(), onupdate=func.now())
     
     # Search and filtering
-    search_vector = Column(Text)  # For full-text search
+    search_vector = Column(
+        TSVECTOR().with_variant(Text(), "sqlite"),
+        Computed(GRANT_SEARCH_DOCUMENT, persisted=True)
+    )
     
     # Timestamps
     created_at = Column(DateTime(timezone=True), server_default=func.now())
     updated_at = Column(DateTime(timezone=True), onupdate=func.now())
     
-    # Relationships
-    applications = relationship("Application", back_populates="grant")
+    # Relationships (collections must be loaded explicitly, see User)
+    applications = relationship(
+        "Application", back_populates="grant", lazy="raise", passive_deletes=True
+    )
+    
+    # Keyset pagination walks (deadline, id) in order
+    __table_args__ = (
+        Index("idx_grants_deadline_id", "deadline", "id"),
+        # Listings filter on status (almost always open) and sort by deadline or recency.
+        # The predicate is rendered by the status column's Enum type, so it uses
+        # the same label as the queries it has to match
+        Index(
+            "idx_grants_open_deadline_id", "deadline", "id",
+            postgresql_where=(status == GrantStatus.OPEN)
+        ),
+        Index("idx_grants_status_created_at", "status", text("created_at DESC")),
+        # Program-filtered searches sorted by deadline
+        Index("idx_grants_program_deadline", "program", "deadline"),
+        Index("idx_grants_search_vector", "search_vector", postgresql_using="gin").ddl_if(dialect="postgresql"),
+        # Trigram indexes let ILIKE '%...%' filters use an index
+        *(
+            Index(
+                f"idx_grants_{column}_trgm", column,
+                postgresql_using="gin", postgresql_ops={column: "gin_trgm_ops"}
+            ).ddl_if(dialect="postgresql")
+            for column in GRANT_TRIGRAM_COLUMNS
+        ),
+        *(
+            Index(f"idx_grants_{column}", column, postgresql_using="gin").ddl_if(dialect="postgresql")
+            for column in GRANT_ARRAY_FILTER_COLUMNS
+        ),
+        *(
+            Index(
+                f"idx_grants_{column}", column,
+                postgresql_using="gin", postgresql_ops={column: "jsonb_path_ops"}
+            ).ddl_if(dialect="postgresql")
+            for column in GRANT_CONTAINMENT_COLUMNS
+        ),
+    )
     
     def __repr__(self):
         return f"<Grant(grant_id='{self.grant_id}', title='{self.title[:50]}')>"
     
-    @property
+    @hybrid_property
     def days_until_deadline(self) -> int:
-        """Calculate days until deadline."""
+        """Calculate days until deadline (unless a query already computed it)."""
+        precomputed = self.__dict__.get("_days_until_deadline")
+        if precomputed is not None:
+            return precomputed
         if self.deadline:
             delta = self.deadline.date() - date.today()
             return max(0, delta.days)
         return 0
+    
+    @days_until_deadline.setter
+    def days_until_deadline(self, days: int):
+        """Store a value computed in SQL so the property doesn't recompute it."""
+        self.__dict__["_days_until_deadline"] = days
+    
+    @days_until_deadline.expression
+    def days_until_deadline(cls):
+        """The same value as a SQL expression, for selecting, filtering and sorting."""
+        return days_until(cls.deadline)
 
 
 class Application(Base):
     """Grant application model."""
     __tablename__ = "applications"
     
-    id = Column(Integer, primary_key=True, index=True)
+    id = Column(BigId, Identity(), primary_key=True)
     
     # References
-    user_id = Column(Integer, ForeignKey("users.id"), nullable=False)
-    company_id = Column(Integer, ForeignKey("companies.id"), nullable=False)
-    grant_id = Column(Integer, ForeignKey("grants.id"), nullable=False)
+    user_id = Column(BigId, ForeignKey("users.id"), nullable=False)
+    company_id = Column(BigId, ForeignKey("companies.id"), nullable=False)
+    grant_id = Column(BigId, ForeignKey("grants.id"), nullable=False)
     
     # Application details
     project_title = Column(String(500))
@@ -251,7 +414,7 @@ class Application(Base):
     # AI Assistant usage
     ai_assistant_used = Column(Boolean, default=False)
     ai_assistant_session_id = Column(String(255))
-    form_completion_percentage = Column(Float, default=0.0)
+    form_completion_percentage = Column(Percentage, default=0.0)
     
     # Form data (JSON storage for flexibility)
     form_data = Column(JSON, default=dict)
@@ -262,7 +425,7 @@ class Application(Base):
     submission_confirmation = Column(String(255))
     
     # Result tracking
-    evaluation_score = Column(Float)
+    evaluation_score = Column(Percentage)
     feedback_received = Column(Text)
     outcome_notes = Column(Text)
     
@@ -270,28 +433,33 @@ class Application(Base):
     created_at = Column(DateTime(timezone=True), server_default=func.now())
     updated_at = Column(DateTime(timezone=True), onupdate=func.now())
     
-    # Relationships
-    user = relationship("User", back_populates="applications")
-    company = relationship("Company", back_populates="applications")
-    grant = relationship("Grant", back_populates="applications")
+    # Relationships (never lazy-loaded: queries that need them must ask for
+    # them, e.g. options(selectinload(Application.grant)), so listing
+    # applications can't silently turn into one SELECT per row)
+    user = relationship("User", back_populates="applications", lazy="raise")
+    company = relationship("Company", back_populates="applications", lazy="raise")
+    grant = relationship("Grant", back_populates="applications", lazy="raise")
     
     # Unique constraint to prevent duplicate applications
     __table_args__ = (
         UniqueConstraint('company_id', 'grant_id', name='unique_company_grant_application'),
+        # Application lists are per user or per company, filtered by status
+        Index("idx_applications_user_status", "user_id", "status"),
+        Index("idx_applications_company_status", "company_id", "status"),
     )
     
     def __repr__(self):
-        return f"<Application(id={self.id}, status='{self.status}', grant='{self.grant.title[:30] if self.grant else 'N/A'}')>"
+        return f"<Application(id={self.id}, status='{self.status}', grant_id={self.grant_id})>"
 
 
 class PaymentTransaction(Base):
     """Payment transaction model."""
     __tablename__ = "payment_transactions"
     
-    id = Column(Integer, primary_key=True, index=True)
+    id = Column(BigId, Identity(), primary_key=True)
     
     # User and payment details
-    user_id = Column(Integer, ForeignKey("users.id"), nullable=False)
+    user_id = Column(BigId, ForeignKey("users.id"), nullable=False)
     stripe_payment_intent_id = Column(String(255), unique=True, nullable=False)
     stripe_session_id = Column(String(255), unique=True, nullable=True)
     
@@ -300,19 +468,33 @@ class PaymentTransaction(Base):
     currency = Column(String(3), default="EUR")
     description = Column(String(500))
     
-    # Payment status
-    status = Column(String(50), default="pending")  # pending, succeeded, failed, cancelled
+    # Payment status (enum labels match the lowercase strings stored before)
+    status = Column(
+        Enum(PaymentStatus, values_callable=enum_values),
+        default=PaymentStatus.PENDING
+    )
     
     # Product information
-    product_type = Column(String(50))  # monthly, yearly, per_application
+    product_type = Column(Enum(ProductType, values_callable=enum_values))
     credits_added = Column(Integer, default=0)
     
     # Timestamps
     created_at = Column(DateTime(timezone=True), server_default=func.now())
     updated_at = Column(DateTime(timezone=True), onupdate=func.now())
     
-    # Relationships
-    user = relationship("User")
+    # Relationships (webhook handlers work from ids, so the user is never
+    # needed implicitly)
+    user = relationship("User", lazy="raise")
+    
+    # Payment history is per user and status; reconciliation scans the
+    # (small) set of still-pending transactions by age
+    __table_args__ = (
+        Index("idx_payment_transactions_user_status", "user_id", "status"),
+        Index(
+            "idx_payment_transactions_pending_created_at", "created_at",
+            postgresql_where=text("status = 'pending'")
+        ),
+    )
     
     def __repr__(self):
         return f"<PaymentTransaction(id={self.id}, amount={self.amount}, status='{self.status}')>"
@@ -6,25 +6,31 @@ from fastapi import APIRouter, HTTPException, Request, Depends
 from fastapi.responses import RedirectResponse
 from sqlalchemy.orm import Session
 from typing import Dict, Any
-import httpx
 from urllib.parse import urlencode
+import asyncio
+import orjson
 
 from .database import get_db
-from .auth import create_or_update_user, create_access_token
-from .config import settings
+from .auth import create_or_update_user, create_access_token, get_oauth_client
+from .config import get_integration_settings, settings
 
 router = APIRouter()
 
+# Upper bound for each call to an OAuth provider, so a hanging provider
+# fails the login instead of pinning the request
+OAUTH_PROVIDER_TIMEOUT = 5  # seconds
+
 
 @router.get("/google")
 async def google_oauth_login():
     """Initiate Google OAuth login."""
-    if not settings.GOOGLE_CLIENT_ID:
+    integrations = get_integration_settings()
+    if not integrations.GOOGLE_CLIENT_ID:
         raise HTTPException(status_code=500, detail="Google OAuth not configured")
     
     params = {
-        "client_id": settings.GOOGLE_CLIENT_ID,
-        "redirect_uri": settings.GOOGLE_REDIRECT_URI,
+        "client_id": integrations.GOOGLE_CLIENT_ID,
+        "redirect_uri": integrations.GOOGLE_REDIRECT_URI,
         "scope": "openid email profile",
         "response_type": "code",
         "access_type": "offline",
@@ -43,6 +49,7 @@ async def google_oauth_callback(
     db: Session = Depends(get_db)
 ):
     """Handle Google OAuth callback."""
+    integrations = get_integration_settings()
     if error:
         return RedirectResponse(url=f"{settings.FRONTEND_URL}/login?error={error}")
     
@@ -50,49 +57,55 @@ async def google_oauth_callback(
         return RedirectResponse(url=f"{settings.FRONTEND_URL}/login?error=no_code")
     
     try:
-        # Exchange code for token
-        async with httpx.AsyncClient() as client:
-            token_data = {
-                "client_id": settings.GOOGLE_CLIENT_ID,
-                "client_secret": settings.GOOGLE_CLIENT_SECRET,
-                "code": code,
-                "grant_type": "authorization_code",
-                "redirect_uri": settings.GOOGLE_REDIRECT_URI,
-            }
-            
-            token_response = await client.post(
+        # Exchange code for token (shared client keeps provider connections warm)
+        client = get_oauth_client()
+        token_data = {
+            "client_id": integrations.GOOGLE_CLIENT_ID,
+            "client_secret": integrations.GOOGLE_CLIENT_SECRET,
+            "code": code,
+            "grant_type": "authorization_code",
+            "redirect_uri": integrations.GOOGLE_REDIRECT_URI,
+        }
+        
+        token_response = await asyncio.wait_for(
+            client.post(
                 "https://oauth2.googleapis.com/token",
                 data=token_data
-            )
-            
-            if token_response.status_code != 200:
-                raise HTTPException(status_code=400, detail="Failed to get access token")
-            
-            tokens = token_response.json()
-            access_token = tokens.get("access_token")
-            
-            # Get user info
-            user_response = await client.get(
+            ),
+            OAUTH_PROVIDER_TIMEOUT
+        )
+        
+        if token_response.status_code != 200:
+            raise HTTPException(status_code=400, detail="Failed to get access token")
+        
+        tokens = orjson.loads(token_response.content)
+        access_token = tokens.get("access_token")
+        
+        # Get user info
+        user_response = await asyncio.wait_for(
+            client.get(
                 "https://www.googleapis.com/oauth2/v2/userinfo",
                 headers={"Authorization": f"Bearer {access_token}"}
-            )
-            
-            if user_response.status_code != 200:
-                raise HTTPException(status_code=400, detail="Failed to get user info")
-            
-            user_info = user_response.json()
-            
-            # Create or update user
-            user = create_or_update_user(user_info, "google", db)
-            
-            # Create JWT token
-            token_data = {"sub": user.id}
-            jwt_token = create_access_token(token_data)
-            
-            # Redirect to frontend with token
-            redirect_url = f"{settings.FRONTEND_URL}/auth/callback?token={jwt_token}"
-            return RedirectResponse(url=redirect_url)
-            
+            ),
+            OAUTH_PROVIDER_TIMEOUT
+        )
+        
+        if user_response.status_code != 200:
+            raise HTTPException(status_code=400, detail="Failed to get user info")
+        
+        user_info = orjson.loads(user_response.content)
+        
+        # Create or update user
+        user = await create_or_update_user(user_info, "google", db)
+        
+        # Create JWT token
+        token_data = {"sub": user.id}
+        jwt_token = create_access_token(token_data)
+        
+        # Redirect to frontend with token
+        redirect_url = f"{settings.FRONTEND_URL}/auth/callback?token={jwt_token}"
+        return RedirectResponse(url=redirect_url)
+        
     except Exception as e:
         return RedirectResponse(url=f"{settings.FRONTEND_URL}/login?error=auth_failed")
 
@@ -100,12 +113,13 @@ async def google_oauth_callback(
 @router.get("/microsoft")
 async def microsoft_oauth_login():
     """Initiate Microsoft OAuth login."""
-    if not settings.MICROSOFT_CLIENT_ID:
+    integrations = get_integration_settings()
+    if not integrations.MICROSOFT_CLIENT_ID:
         raise HTTPException(status_code=500, detail="Microsoft OAuth not configured")
     
     params = {
-        "client_id": settings.MICROSOFT_CLIENT_ID,
-        "redirect_uri": settings.MICROSOFT_REDIRECT_URI,
+        "client_id": integrations.MICROSOFT_CLIENT_ID,
+        "redirect_uri": integrations.MICROSOFT_REDIRECT_URI,
         "response_type": "code",
         "scope": "openid email profile User.Read",
         "response_mode": "query"
@@ -123,6 +137,7 @@ async def microsoft_oauth_callback(
     db: Session = Depends(get_db)
 ):
     """Handle Microsoft OAuth callback."""
+    integrations = get_integration_settings()
     if error:
         return RedirectResponse(url=f"{settings.FRONTEND_URL}/login?error={error}")
     
@@ -130,48 +145,54 @@ async def microsoft_oauth_callback(
         return RedirectResponse(url=f"{settings.FRONTEND_URL}/login?error=no_code")
     
     try:
-        # Exchange code for token
-        async with httpx.AsyncClient() as client:
-            token_data = {
-                "client_id": settings.MICROSOFT_CLIENT_ID,
-                "client_secret": settings.MICROSOFT_CLIENT_SECRET,
-                "code": code,
-                "grant_type": "authorization_code",
-                "redirect_uri": settings.MICROSOFT_REDIRECT_URI,
-            }
-            
-            token_response = await client.post(
+        # Exchange code for token (shared client keeps provider connections warm)
+        client = get_oauth_client()
+        token_data = {
+            "client_id": integrations.MICROSOFT_CLIENT_ID,
+            "client_secret": integrations.MICROSOFT_CLIENT_SECRET,
+            "code": code,
+            "grant_type": "authorization_code",
+            "redirect_uri": integrations.MICROSOFT_REDIRECT_URI,
+        }
+        
+        token_response = await asyncio.wait_for(
+            client.post(
                 "https://login.microsoftonline.com/common/oauth2/v2.0/token",
                 data=token_data
-            )
-            
-            if token_response.status_code != 200:
-                raise HTTPException(status_code=400, detail="Failed to get access token")
-            
-            tokens = token_response.json()
-            access_token = tokens.get("access_token")
-            
-            # Get user info
-            user_response = await client.get(
+            ),
+            OAUTH_PROVIDER_TIMEOUT
+        )
+        
+        if token_response.status_code != 200:
+            raise HTTPException(status_code=400, detail="Failed to get access token")
+        
+        tokens = orjson.loads(token_response.content)
+        access_token = tokens.get("access_token")
+        
+        # Get user info
+        user_response = await asyncio.wait_for(
+            client.get(
                 "https://graph.microsoft.com/v1.0/me",
                 headers={"Authorization": f"Bearer {access_token}"}
-            )
-            
-            if user_response.status_code != 200:
-                raise HTTPException(status_code=400, detail="Failed to get user info")
-            
-            user_info = user_response.json()
-            
-            # Create or update user
-            user = create_or_update_user(user_info, "microsoft", db)
-            
-            # Create JWT token
-            token_data = {"sub": user.id}
-            jwt_token = create_access_token(token_data)
-            
-            # Redirect to frontend with token
-            redirect_url = f"{settings.FRONTEND_URL}/auth/callback?token={jwt_token}"
-            return RedirectResponse(url=redirect_url)
-            
+            ),
+            OAUTH_PROVIDER_TIMEOUT
+        )
+        
+        if user_response.status_code != 200:
+            raise HTTPException(status_code=400, detail="Failed to get user info")
+        
+        user_info = orjson.loads(user_response.content)
+        
+        # Create or update user
+        user = await create_or_update_user(user_info, "microsoft", db)
+        
+        # Create JWT token
+        token_data = {"sub": user.id}
+        jwt_token = create_access_token(token_data)
+        
+        # Redirect to frontend with token
+        redirect_url = f"{settings.FRONTEND_URL}/auth/callback?token={jwt_token}"
+        return RedirectResponse(url=redirect_url)
+        
     except Exception as e:
         return RedirectResponse(url=f"{settings.FRONTEND_URL}/login?error=auth_failed")
@@ -3,22 +3,27 @@ Payment system with Stripe integration for AI Assistant subscriptions.
 """
 
 from typing import Optional, Dict, Any
-from fastapi import APIRouter, Depends, HTTPException, Request
+from fastapi import APIRouter, Depends, HTTPException, Request, Response
+from sqlalchemy import case, update
 from sqlalchemy.orm import Session
 from pydantic import BaseModel
+import asyncio
 import stripe
 from datetime import datetime, timedelta
+from functools import lru_cache
+import orjson
 
 from .database import get_db
-from .models import User, PaymentTransaction, SubscriptionStatus
-from .auth import get_current_user
-from .config import settings
-
-# Configure Stripe
-stripe.api_key = settings.STRIPE_SECRET_KEY
+from .models import User, PaymentTransaction, SubscriptionStatus, PaymentStatus, ProductType
+from .auth import get_current_user, invalidate_cached_user
+from .config import get_integration_settings
 
 router = APIRouter()
 
+# Pricing is the same for everyone and only changes on deploy, so browsers
+# and CDNs may keep it
+PRICING_CACHE_CONTROL = "public, max-age=3600, s-maxage=86400"
+
 
 class CreatePaymentIntentRequest(BaseModel):
     """Request to create payment intent."""
@@ -42,12 +47,13 @@ class SubscriptionResponse(BaseModel):
     usage_count: int
 
 
-@router.get("/pricing")
-async def get_pricing():
-    """Get pricing information for AI Assistant."""
-    return {
+@lru_cache()
+def get_pricing_json() -> bytes:
+    """Serialized pricing information; it only depends on settings."""
+    integrations = get_integration_settings()
+    return orjson.dumps({
         "monthly": {
-            "price": settings.AI_ASSISTANT_PRICE_MONTHLY,
+            "price": integrations.AI_ASSISTANT_PRICE_MONTHLY,
             "currency": "eur",
             "description": "Monthly AI Assistant subscription",
             "features": [
@@ -58,7 +64,7 @@ async def get_pricing():
             ]
         },
         "yearly": {
-            "price": settings.AI_ASSISTANT_PRICE_YEARLY,
+            "price": integrations.AI_ASSISTANT_PRICE_YEARLY,
             "currency": "eur", 
             "description": "Yearly AI Assistant subscription (2 months free)",
             "features": [
@@ -70,7 +76,7 @@ async def get_pricing():
             ]
         },
         "per_application": {
-            "price": settings.AI_ASSISTANT_PRICE_PER_APPLICATION,
+            "price": integrations.AI_ASSISTANT_PRICE_PER_APPLICATION,
             "currency": "eur",
             "description": "Pay per grant application",
             "features": [
@@ -80,7 +86,17 @@ async def get_pricing():
                 "Application review"
             ]
         }
-    }
+    })
+
+
+@router.get("/pricing")
+async def get_pricing():
+    """Get pricing information for AI Assistant."""
+    return Response(
+        content=get_pricing_json(),
+        media_type="application/json",
+        headers={"Cache-Control": PRICING_CACHE_CONTROL}
+    )
 
 
 @router.post("/create-payment-intent", response_model=PaymentIntentResponse)
@@ -90,36 +106,43 @@ async def create_payment_intent(
     db: Session = Depends(get_db)
 ):
     """Create Stripe payment intent for AI Assistant subscription."""
+    integrations = get_integration_settings()
     
     # Determine amount based on product type
-    if request.product_type == "monthly":
-        amount = settings.AI_ASSISTANT_PRICE_MONTHLY
+    if request.product_type == ProductType.MONTHLY:
+        amount = integrations.AI_ASSISTANT_PRICE_MONTHLY
         description = "AI Assistant Monthly Subscription"
-    elif request.product_type == "yearly":
-        amount = settings.AI_ASSISTANT_PRICE_YEARLY
+    elif request.product_type == ProductType.YEARLY:
+        amount = integrations.AI_ASSISTANT_PRICE_YEARLY
         description = "AI Assistant Yearly Subscription"
-    elif request.product_type == "per_application":
-        amount = settings.AI_ASSISTANT_PRICE_PER_APPLICATION
+    elif request.product_type == ProductType.PER_APPLICATION:
+        amount = integrations.AI_ASSISTANT_PRICE_PER_APPLICATION
         description = "AI Assistant Per Application"
     else:
         raise HTTPException(status_code=400, detail="Invalid product type")
     
     try:
-        # Create or get Stripe customer
-        if not current_user.stripe_customer_id:
-            customer = stripe.Customer.create(
+        # Talk to Stripe first; nothing is written to the database until
+        # both calls have returned. The SDK is blocking, so its calls run in
+        # a worker thread to keep the event loop free
+        customer_id = current_user.stripe_customer_id
+        if not customer_id:
+            customer = await asyncio.to_thread(
+                stripe.Customer.create,
+                api_key=integrations.STRIPE_SECRET_KEY,
                 email=current_user.email,
                 name=current_user.full_name,
                 metadata={"user_id": current_user.id}
             )
-            current_user.stripe_customer_id = customer.id
-            db.commit()
+            customer_id = customer.id
         
         # Create payment intent
-        intent = stripe.PaymentIntent.create(
+        intent = await asyncio.to_thread(
+            stripe.PaymentIntent.create,
+            api_key=integrations.STRIPE_SECRET_KEY,
             amount=amount,
             currency=request.currency,
-            customer=current_user.stripe_customer_id,
+            customer=customer_id,
             description=description,
             metadata={
                 "user_id": current_user.id,
@@ -127,18 +150,22 @@ async def create_payment_intent(
             }
         )
         
-        # Store payment transaction
+        # Save the new customer id and the pending transaction in one commit
+        is_new_customer = customer_id != current_user.stripe_customer_id
+        current_user.stripe_customer_id = customer_id
         transaction = PaymentTransaction(
             user_id=current_user.id,
             stripe_payment_intent_id=intent.id,
             amount=amount,
             currency=request.currency.upper(),
             description=description,
-            product_type=request.product_type,
-            status="pending"
+            product_type=ProductType(request.product_type),
+            status=PaymentStatus.PENDING
         )
         db.add(transaction)
         db.commit()
+        if is_new_customer:
+            await invalidate_cached_user(current_user.id)
         
         return PaymentIntentResponse(
             client_secret=intent.client_secret,
@@ -156,13 +183,21 @@ async def create_payment_intent(
 @router.post("/webhook")
 async def stripe_webhook(request: Request, db: Session = Depends(get_db)):
     """Handle Stripe webhooks."""
+    integrations = get_integration_settings()
     payload = await request.body()
     sig_header = request.headers.get("stripe-signature")
     
     try:
-        event = stripe.Webhook.construct_event(
-            payload, sig_header, settings.STRIPE_WEBHOOK_SECRET
+        # Check the signature off the event loop, then parse the payload
+        # once with orjson instead of letting the SDK build an Event object
+        await asyncio.to_thread(
+            stripe.WebhookSignature.verify_header,
+            payload.decode("utf-8"),
+            sig_header,
+            integrations.STRIPE_WEBHOOK_SECRET,
+            stripe.Webhook.DEFAULT_TOLERANCE
         )
+        event = orjson.loads(payload)
     except ValueError:
         raise HTTPException(status_code=400, detail="Invalid payload")
     except stripe.error.SignatureVerificationError:
@@ -182,55 +217,73 @@ async def stripe_webhook(request: Request, db: Session = Depends(get_db)):
 
 
 async def handle_payment_success(payment_intent: Dict[str, Any], db: Session):
-    """Handle successful payment."""
-    user_id = int(payment_intent["metadata"]["user_id"])
-    product_type = payment_intent["metadata"]["product_type"]
-    
-    # Update payment transaction
-    transaction = db.query(PaymentTransaction).filter(
-        PaymentTransaction.stripe_payment_intent_id == payment_intent["id"]
+    """Handle successful payment (redelivered webhooks are no-ops)."""
+    # Only the first delivery moves the transaction to succeeded, so a
+    # Stripe retry finds nothing to update and can't credit the user twice.
+    # A failed intent can still succeed when the customer retries payment
+    transaction = db.execute(
+        update(PaymentTransaction)
+        .where(
+            PaymentTransaction.stripe_payment_intent_id == payment_intent["id"],
+            PaymentTransaction.status.in_([PaymentStatus.PENDING, PaymentStatus.FAILED])
+        )
+        .values(
+            status=PaymentStatus.SUCCEEDED,
+            credits_added=case(
+                (PaymentTransaction.product_type == ProductType.PER_APPLICATION, 1),
+                else_=PaymentTransaction.credits_added
+            )
+        )
+        .returning(PaymentTransaction.user_id, PaymentTransaction.product_type)
     ).first()
     
-    if transaction:
-        transaction.status = "succeeded"
-        
-        # Update user subscription
-        user = db.query(User).filter(User.id == user_id).first()
-        if user:
-            now = datetime.utcnow()
-            
-            if product_type == "monthly":
-                user.subscription_status = SubscriptionStatus.MONTHLY
-                user.subscription_start_date = now
-                user.subscription_end_date = now + timedelta(days=30)
-                
-            elif product_type == "yearly":
-                user.subscription_status = SubscriptionStatus.YEARLY
-                user.subscription_start_date = now
-                user.subscription_end_date = now + timedelta(days=365)
-                
-            elif product_type == "per_application":
-                user.subscription_status = SubscriptionStatus.PAY_PER_USE
-                user.ai_assistant_credits += 1
-                transaction.credits_added = 1
-        
-        db.commit()
+    if transaction is None:
+        return
+    
+    # Update user subscription
+    now = datetime.utcnow()
+    if transaction.product_type == ProductType.MONTHLY:
+        subscription = {
+            "subscription_status": SubscriptionStatus.MONTHLY,
+            "subscription_start_date": now,
+            "subscription_end_date": now + timedelta(days=30),
+        }
+    elif transaction.product_type == ProductType.YEARLY:
+        subscription = {
+            "subscription_status": SubscriptionStatus.YEARLY,
+            "subscription_start_date": now,
+            "subscription_end_date": now + timedelta(days=365),
+        }
+    else:
+        subscription = {
+            "subscription_status": SubscriptionStatus.PAY_PER_USE,
+            "ai_assistant_credits": User.ai_assistant_credits + 1,
+        }
+    
+    db.execute(update(User).where(User.id == transaction.user_id).values(**subscription))
+    db.commit()
+    await invalidate_cached_user(transaction.user_id)
 
 
 async def handle_payment_failure(payment_intent: Dict[str, Any], db: Session):
     """Handle failed payment."""
-    transaction = db.query(PaymentTransaction).filter(
-        PaymentTransaction.stripe_payment_intent_id == payment_intent["id"]
-    ).first()
-    
-    if transaction:
-        transaction.status = "failed"
-        db.commit()
+    # Never downgrade a transaction that has already succeeded (webhooks can
+    # arrive out of order)
+    db.execute(
+        update(PaymentTransaction)
+        .where(
+            PaymentTransaction.stripe_payment_intent_id == payment_intent["id"],
+            PaymentTransaction.status == PaymentStatus.PENDING
+        )
+        .values(status=PaymentStatus.FAILED)
+    )
+    db.commit()
 
 
 @router.get("/subscription", response_model=SubscriptionResponse)
 async def get_subscription_status(
-    current_user: User = Depends(get_current_user)
+    current_user: User = Depends(get_current_user),
+    db: Session = Depends(get_db)
 ):
     """Get current user's subscription status."""
     expires_at = None
@@ -239,14 +292,10 @@ async def get_subscription_status(
         
         # Check if subscription has expired
         if expires_at < datetime.utcnow() and current_user.subscription_status != SubscriptionStatus.FREE:
-            # Update subscription status
-            from .database import SessionLocal
-            db = SessionLocal()
-            user = db.query(User).filter(User.id == current_user.id).first()
-            user.subscription_status = SubscriptionStatus.FREE
-            db.commit()
-            db.close()
+            # Update subscription status (current_user belongs to the request session)
             current_user.subscription_status = SubscriptionStatus.FREE
+            db.commit()
+            await invalidate_cached_user(current_user.id)
     
     return SubscriptionResponse(
         status=current_user.subscription_status,
@@ -265,6 +314,7 @@ async def cancel_subscription(
     if current_user.subscription_status in [SubscriptionStatus.MONTHLY, SubscriptionStatus.YEARLY]:
         current_user.subscription_status = SubscriptionStatus.CANCELLED
         db.commit()
+        await invalidate_cached_user(current_user.id)
         
         return {"message": "Subscription cancelled successfully"}
     else:
@@ -3,17 +3,36 @@ Simple grants API that reads from Supabase database.
 This provides fast access to grants data from the PostgreSQL database.
 """
 
-import json
+import base64
+import binascii
 import os
 from datetime import datetime
-from typing import List, Dict, Any, Optional
+from functools import lru_cache
+from typing import TYPE_CHECKING, Any, AsyncGenerator, Dict, List, Optional, Tuple
+
+import orjson
 
 from fastapi import APIRouter, HTTPException, Query, Depends
+from fastapi.responses import ORJSONResponse
 from pydantic import BaseModel
-from sqlalchemy import create_engine, text
-from sqlalchemy.orm import sessionmaker, Session
+from sqlalchemy import text
+from sqlalchemy.dialects.postgresql import JSONB
+
+from .cache import cache_get, cache_set
+from .database import get_async_db, get_async_session_factory
+
+if TYPE_CHECKING:
+    from sqlalchemy.ext.asyncio import AsyncSession
+
+router = APIRouter(default_response_class=ORJSONResponse)
+
+# Stats aggregate the whole grants table but only change when grants are
+# ingested, so one computation is shared by every caller for a minute
+GRANT_STATS_CACHE_KEY = "grants:simple:stats:v1"
+GRANT_STATS_CACHE_TTL = 60  # seconds
 
-router = APIRouter()
+# Rows fetched per round trip when streaming a result page
+PAGE_FETCH_CHUNK = 50
 
 
 class SimpleGrant(BaseModel):
@@ -48,12 +67,63 @@ class SimpleGrantListResponse(BaseModel):
     page: int
     limit: int
     total_pages: int
+    next_cursor: Optional[str] = None  # pass back as cursor to fetch the next page
+
+
+# Columns SimpleGrant is built from; avoids shipping unused wide columns.
+# complexity_score is numeric, which the driver would return as Decimal, and
+# days until the deadline are worked out by the database
+GRANT_COLUMNS = (
+    "id, grant_id, title, program, description, synopsis, total_budget, "
+    "min_funding_amount, max_funding_amount, deadline, eligible_countries, "
+    "target_organizations, keywords, technology_areas, industry_sectors, "
+    "url, documents_url, status, complexity_score::float8 AS complexity_score, created_at, "
+    "COALESCE(deadline::date - CURRENT_DATE, 0) AS days_until_deadline"
+)
+
+# Typed so the jsonb arrays come back as lists (asyncpg hands raw SQL jsonb
+# back as text)
+GRANT_COLUMN_TYPES = {
+    "eligible_countries": JSONB,
+    "target_organizations": JSONB,
+    "keywords": JSONB,
+    "technology_areas": JSONB,
+    "industry_sectors": JSONB,
+}
+
+
+GRANT_DETAIL_STATEMENT = text(
+    f"SELECT {GRANT_COLUMNS} FROM grants WHERE grant_id = :grant_id"
+).columns(**GRANT_COLUMN_TYPES)
 
 
-# Database configuration - initialize only when needed
-engine = None
-SessionLocal = None
+# AVG skips NULL complexity scores; GROUPING() tells the three sets apart
+GRANT_STATS_STATEMENT = text("""
+    SELECT program, status, GROUPING(program, status) AS grouped_by,
+           COUNT(*) AS grants, AVG(complexity_score) AS avg_complexity
+    FROM grants
+    GROUP BY GROUPING SETS ((program), (status), ())
+""")
 
+
+@lru_cache(maxsize=64)
+def grants_page_statement(where_clause: str):
+    """Listing query for one combination of filters.
+    
+    Filter values are bound parameters, so there are only a handful of
+    distinct where clauses; reusing the same statement object lets SQLAlchemy
+    reuse its compiled form and asyncpg its prepared statement.
+    """
+    return text(f"""
+        SELECT {GRANT_COLUMNS}, COUNT(*) OVER () AS total_count FROM grants 
+        {where_clause}
+        ORDER BY deadline ASC, id ASC
+        LIMIT :limit OFFSET :offset
+    """).columns(**GRANT_COLUMN_TYPES)
+
+
+# Database sessions come from the app's shared async engine (asyncpg), so
+# queries don't block the event loop or hop through the threadpool
 def get_database_url():
     """Get database URL from environment variables."""
     # First check environment variables for Supabase
@@ -83,42 +153,91 @@ def get_database_url():
     
     return database_url
 
-def initialize_database():
-    """Initialize database connection."""
-    global engine, SessionLocal
-    if engine is None:
-        database_url = get_database_url()
-        engine = create_engine(database_url)
-        SessionLocal = sessionmaker(autocommit=False, autoflush=False, bind=engine)
-
-def get_database() -> Session:
-    """Get database session."""
-    db = SessionLocal()
-    try:
-        return db
-    finally:
-        pass  # Don't close here, let the dependency handle it
-
-def get_db_session():
-    """Dependency for getting database session."""
-    initialize_database()  # Ensure database is initialized
-    db = SessionLocal()
+
+# Why initialize_database() found no usable database, if it didn't; the
+# routes answer 503 instead of querying until the configuration is fixed
+_database_error: Optional[str] = None
+
+
+def initialize_database() -> bool:
+    """Check the database configuration and create the async engine (run once at startup)."""
+    global _database_error
     try:
+        get_database_url()  # Refuse to run against a missing or localhost database
+        if get_async_session_factory() is None:
+            raise RuntimeError("Async database sessions not configured")
+    except (ValueError, RuntimeError) as e:
+        _database_error = str(e)
+        return False
+    
+    _database_error = None
+    return True
+
+
+async def get_db_session() -> AsyncGenerator["AsyncSession", None]:
+    """Dependency for getting an async database session."""
+    if _database_error is not None:
+        raise HTTPException(status_code=503, detail="Grants database not configured")
+    async for db in get_async_db():
         yield db
-    finally:
-        db.close()
 
 
-def parse_json_field(value: Any) -> List[str]:
-    """Parse JSON field from database."""
+def grant_row_content(row) -> Dict[str, Any]:
+    """Turn a GRANT_COLUMNS row into SimpleGrant-shaped JSON content."""
+    content = dict(row)
+    content.pop("total_count", None)
+    for column in GRANT_COLUMN_TYPES:
+        content[column] = content[column] or []
+    return content
+
+
+def encode_cursor(deadline: datetime, grant_id: int) -> str:
+    """Encode a (deadline, id) listing position as an opaque keyset cursor."""
+    position = f"{deadline.isoformat()}|{grant_id}"
+    return base64.urlsafe_b64encode(position.encode()).decode()
+
+
+def decode_cursor(cursor: str) -> Tuple[datetime, int]:
+    """Decode a keyset cursor back to its (deadline, id) position."""
     try:
-        if isinstance(value, list):
-            return value
-        if isinstance(value, str):
-            return json.loads(value) if value else []
-        return []
-    except (json.JSONDecodeError, TypeError):
-        return []
+        deadline, grant_id = base64.urlsafe_b64decode(cursor.encode()).decode().split("|")
+        return datetime.fromisoformat(deadline), int(grant_id)
+    except (binascii.Error, UnicodeDecodeError, ValueError):
+        raise HTTPException(status_code=400, detail="Invalid cursor")
+
+
+async def fetch_grants_page(
+    db: "AsyncSession", where_clause: str, params: Dict[str, Any], limit: int, offset: int
+) -> Tuple[List[bytes], int, Optional[Tuple[datetime, int]]]:
+    """
+    Fetch one listing page as JSON-encoded grants, the match count and the
+    (deadline, id) position of the last grant.
+    
+    The whole page is loaded by a fixed number of queries. Data for related
+    tables should be loaded for the page at once (WHERE grant_id = ANY(:ids)
+    over the page's ids), never with a query per grant.
+    """
+    result = await db.stream(
+        grants_page_statement(where_clause).execution_options(yield_per=PAGE_FETCH_CHUNK),
+        {**params, "limit": limit, "offset": offset}
+    )
+    
+    # Rows arrive in chunks from a server-side cursor and are encoded to
+    # JSON as they come, so neither the rows nor per-grant dicts are kept
+    # for the whole page
+    encoded_grants = []
+    total_count = 0
+    last_position = None
+    async for row in result.mappings():
+        encoded_grants.append(orjson.dumps(grant_row_content(row)))
+        total_count, last_position = row['total_count'], (row['deadline'], row['id'])
+    
+    if not encoded_grants and offset:
+        # Past the last page there is no row to carry the count
+        count_sql = f"SELECT COUNT(*) FROM grants {where_clause}"
+        total_count = (await db.execute(text(count_sql), params)).scalar()
+    
+    return encoded_grants, total_count, last_position
 
 
 @router.get("/simple", response_model=SimpleGrantListResponse)
@@ -130,9 +249,18 @@ async def list_grants_simple(
     min_amount: Optional[int] = Query(None, description="Minimum funding amount"),
     max_amount: Optional[int] = Query(None, description="Maximum funding amount"),
     technology_areas: Optional[str] = Query(None, description="Technology areas (comma-separated)"),
-    db: Session = Depends(get_db_session)
+    cursor: Optional[str] = Query(None, description="Keyset cursor from a previous page"),
+    db: "AsyncSession" = Depends(get_db_session)
 ):
-    """List grants from Supabase database."""
+    """
+    List grants from Supabase database.
+    
+    Passing a previous response's next_cursor as cursor continues after its
+    last grant without an OFFSET scan; page is then ignored and total_count
+    counts the grants from the cursor on.
+    """
+    # Decoded up front so a bad cursor is a 400, not a database error
+    position = decode_cursor(cursor) if cursor else None
     
     try:
         # Build query
@@ -140,8 +268,9 @@ async def list_grants_simple(
         params = {}
         
         if query:
-            where_clauses.append("(title ILIKE :query OR description ILIKE :query OR synopsis ILIKE :query)")
-            params["query"] = f"%{query}%"
+            # Full-text match on the generated search_vector column (GIN indexed)
+            where_clauses.append("search_vector @@ plainto_tsquery('english', :query)")
+            params["query"] = query
         
         if program:
             where_clauses.append("program ILIKE :program")
@@ -155,99 +284,89 @@ async def list_grants_simple(
             where_clauses.append("(max_funding_amount <= :max_amount OR max_funding_amount IS NULL)")
             params["max_amount"] = max_amount
         
-        where_clause = "WHERE " + " AND ".join(where_clauses) if where_clauses else ""
+        if position:
+            # Keyset pagination: seek straight past the previous page along
+            # the (deadline, id) index
+            where_clauses.append("(deadline, id) > (:after_deadline, :after_id)")
+            params["after_deadline"], params["after_id"] = position
         
-        # Get total count
-        count_sql = f"SELECT COUNT(*) FROM grants {where_clause}"
-        result = db.execute(text(count_sql), params)
-        total_count = result.scalar()
-        
-        # Get grants with pagination
-        offset = (page - 1) * limit
-        grants_sql = f"""
-            SELECT * FROM grants 
-            {where_clause}
-            ORDER BY deadline ASC
-            LIMIT :limit OFFSET :offset
-        """
-        params["limit"] = limit
-        params["offset"] = offset
-        
-        result = db.execute(text(grants_sql), params)
-        grant_rows = result.mappings().all()
-        grants = []
+        where_clause = "WHERE " + " AND ".join(where_clauses) if where_clauses else ""
         
-        for row in grant_rows:
-            # Calculate days until deadline
-            try:
-                if isinstance(row['deadline'], str):
-                    deadline_dt = datetime.fromisoformat(row['deadline'].replace('Z', '+00:00'))
-                else:
-                    deadline_dt = row['deadline']
-                days_until = (deadline_dt.date() - datetime.now().date()).days
-            except:
-                days_until = 0
-            
-            grant = SimpleGrant(
-                id=row['id'],
-                grant_id=row['grant_id'],
-                title=row['title'],
-                program=row['program'],
-                description=row['description'],
-                synopsis=row['synopsis'],
-                total_budget=row['total_budget'],
-                min_funding_amount=row['min_funding_amount'],
-                max_funding_amount=row['max_funding_amount'],
-                deadline=row['deadline'] if isinstance(row['deadline'], str) else row['deadline'].isoformat(),
-                days_until_deadline=days_until,
-                eligible_countries=parse_json_field(row['eligible_countries']),
-                target_organizations=parse_json_field(row['target_organizations']),
-                keywords=parse_json_field(row['keywords']),
-                technology_areas=parse_json_field(row['technology_areas']),
-                industry_sectors=parse_json_field(row['industry_sectors']),
-                url=row['url'],
-                documents_url=row['documents_url'],
-                status=row['status'],
-                complexity_score=row['complexity_score'],
-                created_at=row['created_at'] if isinstance(row['created_at'], str) else row['created_at'].isoformat()
-            )
-            grants.append(grant)
+        # Get grants with pagination; the window count returns the total
+        # number of matches with the page, so the filter runs only once
+        offset = 0 if position else (page - 1) * limit
+        encoded_grants, total_count, last_position = await fetch_grants_page(
+            db, where_clause, params, limit, offset
+        )
         
         total_pages = (total_count + limit - 1) // limit
+        has_more = offset + len(encoded_grants) < total_count
         
-        return SimpleGrantListResponse(
-            grants=grants,
-            total_count=total_count,
-            page=page,
-            limit=limit,
-            total_pages=total_pages
-        )
+        # Rows come from a fixed schema, so they're serialized straight to
+        # JSON rather than through SimpleGrant models (which only document
+        # the response)
+        return ORJSONResponse(content={
+            "grants": orjson.Fragment(b"[" + b",".join(encoded_grants) + b"]"),
+            "total_count": total_count,
+            "page": page,
+            "limit": limit,
+            "total_pages": total_pages,
+            "next_cursor": encode_cursor(*last_position) if has_more else None
+        })
     
     except Exception as e:
         raise HTTPException(status_code=500, detail=f"Database error: {str(e)}")
 
 
+# Declared before /simple/{grant_id} so "stats" isn't matched as a grant ID
+@router.get("/simple/stats")
+async def get_grants_stats(db: "AsyncSession" = Depends(get_db_session)):
+    """Get grants statistics."""
+    cached = await cache_get(GRANT_STATS_CACHE_KEY)
+    if cached is not None:
+        return cached
+    
+    try:
+        # One pass over grants: per-program counts (grouped_by = 1), per-status
+        # counts (2) and the overall count and average (3)
+        result = await db.execute(GRANT_STATS_STATEMENT)
+        total_grants, avg_complexity = 0, None
+        by_program, by_status = {}, {}
+        for row in result.mappings():
+            if row['grouped_by'] == 1:
+                by_program[row['program']] = row['grants']
+            elif row['grouped_by'] == 2:
+                # JSON object keys must be strings, including for grants without a status
+                by_status["null" if row['status'] is None else row['status']] = row['grants']
+            else:
+                total_grants, avg_complexity = row['grants'], row['avg_complexity']
+        avg_complexity = avg_complexity or 0
+        
+        stats = {
+            "total_grants": total_grants,
+            "by_program": by_program,
+            "by_status": by_status,
+            "average_complexity_score": round(float(avg_complexity), 1)
+        }
+    
+    except Exception as e:
+        raise HTTPException(status_code=500, detail=f"Database error: {str(e)}")
+    
+    await cache_set(GRANT_STATS_CACHE_KEY, stats, GRANT_STATS_CACHE_TTL)
+    return stats
+
+
 @router.get("/simple/{grant_id}", response_model=SimpleGrant)
-async def get_grant_simple(grant_id: str, db: Session = Depends(get_db_session)):
+async def get_grant_simple(grant_id: str, db: "AsyncSession" = Depends(get_db_session)):
     """Get a specific grant by ID."""
     
     try:
-        result = db.execute(text("SELECT * FROM grants WHERE grant_id = :grant_id"), {"grant_id": grant_id})
+        result = await db.execute(GRANT_DETAIL_STATEMENT, {"grant_id": grant_id})
         row = result.mappings().first()
         
         if not row:
             raise HTTPException(status_code=404, detail="Grant not found")
         
-        # Calculate days until deadline
-        try:
-            if isinstance(row['deadline'], str):
-                deadline_dt = datetime.fromisoformat(row['deadline'].replace('Z', '+00:00'))
-            else:
-                deadline_dt = row['deadline']
-            days_until = (deadline_dt.date() - datetime.now().date()).days
-        except:
-            days_until = 0
-        
         return SimpleGrant(
             id=row['id'],
             grant_id=row['grant_id'],
@@ -259,12 +378,12 @@ async def get_grant_simple(grant_id: str, db: Session = Depends(get_db_session))
             min_funding_amount=row['min_funding_amount'],
             max_funding_amount=row['max_funding_amount'],
             deadline=row['deadline'] if isinstance(row['deadline'], str) else row['deadline'].isoformat(),
-            days_until_deadline=days_until,
-            eligible_countries=parse_json_field(row['eligible_countries']),
-            target_organizations=parse_json_field(row['target_organizations']),
-            keywords=parse_json_field(row['keywords']),
-            technology_areas=parse_json_field(row['technology_areas']),
-            industry_sectors=parse_json_field(row['industry_sectors']),
+            days_until_deadline=row['days_until_deadline'],
+            eligible_countries=row['eligible_countries'] or [],
+            target_organizations=row['target_organizations'] or [],
+            keywords=row['keywords'] or [],
+            technology_areas=row['technology_areas'] or [],
+            industry_sectors=row['industry_sectors'] or [],
             url=row['url'],
             documents_url=row['documents_url'],
             status=row['status'],
@@ -276,35 +395,3 @@ async def get_grant_simple(grant_id: str, db: Session = Depends(get_db_session))
         raise
     except Exception as e:
         raise HTTPException(status_code=500, detail=f"Database error: {str(e)}")
-
-
-@router.get("/simple/stats")
-async def get_grants_stats(db: Session = Depends(get_db_session)):
-    """Get grants statistics."""
-    
-    try:
-        # Total grants
-        result = db.execute(text("SELECT COUNT(*) FROM grants"))
-        total_grants = result.scalar()
-        
-        # Grants by program
-        result = db.execute(text("SELECT program, COUNT(*) FROM grants GROUP BY program"))
-        by_program = dict(result.fetchall())
-        
-        # Grants by status
-        result = db.execute(text("SELECT status, COUNT(*) FROM grants GROUP BY status"))
-        by_status = dict(result.fetchall())
-        
-        # Average complexity score
-        result = db.execute(text("SELECT AVG(complexity_score) FROM grants WHERE complexity_score IS NOT NULL"))
-        avg_complexity = result.scalar() or 0
-        
-        return {
-            "total_grants": total_grants,
-            "by_program": by_program,
-            "by_status": by_status,
-            "average_complexity_score": round(avg_complexity, 1)
-        }
-    
-    except Exception as e:
-        raise HTTPException(status_code=500, detail=f"Database error: {str(e)}")
@@ -12,6 +12,7 @@ import os
 import sys
 import asyncio
 from datetime import datetime, timedelta
+from operator import itemgetter
 from dotenv import load_dotenv
 
 # Load environment variables
@@ -20,27 +21,30 @@ load_dotenv()
 # Add the app directory to the path
 sys.path.insert(0, os.path.dirname(__file__))
 
-def test_database_connection():
+# From this many rows on, grant seeds stream through COPY
+BULK_COPY_THRESHOLD = 100
+
+async def test_database_connection():
     """Test if we can connect to the database."""
     try:
-        from sqlalchemy import create_engine, text
-        from app.config import settings
-        
-        # Use Supabase URL if available, otherwise fallback to default
-        supabase_url = os.getenv("SUPABASE_DATABASE_URL")
-        database_url = supabase_url or settings.DATABASE_URL
+        from sqlalchemy import text
+        from app.database import DATABASE_URL, get_async_engine
         
+        # The app's shared async engine (SUPABASE_DATABASE_URL, falling back
+        # to DATABASE_URL) also serves the seed step
         print(f"🔄 Testing database connection...")
-        print(f"   URL: {database_url.split('@')[1] if '@' in database_url else 'local'}")
+        print(f"   URL: {DATABASE_URL.split('@')[1] if '@' in DATABASE_URL else 'local'}")
         
-        engine = create_engine(database_url)
+        engine = get_async_engine()
+        if engine is None:
+            raise RuntimeError("Async database sessions not configured")
         
-        with engine.connect() as conn:
-            result = conn.execute(text("SELECT version(), current_database();"))
+        async with engine.connect() as conn:
+            result = await conn.execute(text("SELECT current_setting('server_version_num')::int, current_database();"))
             row = result.fetchone()
             
         print(f"✅ Database connection successful!")
-        print(f"   PostgreSQL: {row[0].split(' ')[1]}")
+        print(f"   PostgreSQL: {row[0] // 10000}.{row[0] % 100}")
         print(f"   Database: {row[1]}")
         return True
         
@@ -58,171 +62,264 @@ def run_migrations():
     print(f"\n🏗️  Running database migrations...")
     
     try:
-        # Set the Supabase database URL as environment variable for Alembic
-        supabase_url = os.getenv("SUPABASE_DATABASE_URL")
-        if supabase_url:
-            os.environ["DATABASE_URL"] = supabase_url
+        from alembic import command
+        from alembic.config import Config
+        from alembic.util import CommandError
+        from app.database import get_engine
         
-        # Run Alembic upgrade
-        exit_code = os.system("alembic upgrade head")
+        # Run in-process on the app's engine instead of spawning the alembic
+        # CLI, which would re-import everything and open its own connection
+        config = Config()
+        config.set_main_option("script_location", os.path.join(os.path.dirname(__file__), "migrations"))
         
-        if exit_code == 0:
-            print(f"✅ Database schema created successfully!")
-            return True
-        else:
-            print(f"❌ Migration failed with exit code: {exit_code}")
+        try:
+            with get_engine().begin() as connection:
+                config.attributes["connection"] = connection
+                command.upgrade(config, "head")
+        except CommandError as e:
+            print(f"❌ Migration failed: {e}")
             return False
+        
+        print(f"✅ Database schema created successfully!")
+        return True
             
     except Exception as e:
         print(f"❌ Migration error: {e}")
         return False
 
 
+# Sample grants seeded into an empty database; the _*_days offsets become
+# dates relative to the time of seeding
+_SAMPLE_GRANTS = (
+    dict(
+        grant_id="HE-2024-AI-001",
+        title="AI for Healthcare SMEs",
+        program="Horizon Europe",
+        description="This call supports Small and Medium Enterprises (SMEs) in developing artificial intelligence solutions for healthcare applications. Focus areas include machine learning for medical diagnosis, natural language processing for clinical documentation, and computer vision for medical imaging.",
+        synopsis="AI solutions for healthcare: ML diagnosis, NLP clinical docs, CV medical imaging",
+        total_budget=10000000,
+        min_funding_amount=50000,
+        max_funding_amount=500000,
+        _deadline_days=45,
+        _start_days=120,
+        _end_days=120 + 730,  # 2 years
+        project_duration_months=24,
+        eligible_countries=["DE", "FR", "IT", "ES", "NL", "BE", "AT", "SE", "DK", "FI"],
+        target_organizations=["SME", "Small Enterprise", "Medium Enterprise"],
+        keywords=["artificial intelligence", "healthcare", "machine learning", "medical diagnosis", "clinical validation"],
+        technology_areas=["AI", "Healthcare", "Machine Learning"],
+        industry_sectors=["Healthcare", "Technology"],
+        url="https://ec.europa.eu/info/funding-tenders/opportunities/portal/screen/opportunities/topic-details/HORIZON-EIC-2024-PATHFINDEROPEN-01",
+        documents_url="https://ec.europa.eu/info/funding-tenders/opportunities/documents",
+        source_system="horizon_europe",
+        complexity_score=65.0
+    ),
+    dict(
+        grant_id="DIGITAL-EU-2024-002",
+        title="Digital Innovation for Manufacturing SMEs",
+        program="Digital Europe",
+        description="Supporting digital transformation in European manufacturing through Industry 4.0 technologies. This call targets SMEs developing solutions in areas such as IoT integration, predictive maintenance using AI, automated quality control, and supply chain optimization.",
+        synopsis="Industry 4.0: IoT, AI predictive maintenance, automated quality control",
+        total_budget=5000000,
+        min_funding_amount=75000,
+        max_funding_amount=300000,
+        _deadline_days=60,
+        _start_days=90,
+        _end_days=90 + 540,  # 18 months
+        project_duration_months=18,
+        eligible_countries=["DE", "FR", "IT", "ES", "PL", "CZ", "HU", "SK"],
+        target_organizations=["SME", "Manufacturing Company", "Technology Provider"],
+        keywords=["digital transformation", "industry 40", "iot", "predictive maintenance", "automation"],
+        technology_areas=["IoT", "AI", "Manufacturing"],
+        industry_sectors=["Manufacturing", "Technology"],
+        url="https://digital-strategy.ec.europa.eu/en/activities/digital-programme",
+        source_system="digital_europe",
+        complexity_score=55.0
+    ),
+    dict(
+        grant_id="LIFE-2024-GREEN-004",
+        title="AI-Powered Environmental Monitoring Solutions",
+        program="Life",
+        description="Developing AI solutions for environmental monitoring and protection. Focus on satellite data analysis, IoT sensor networks, predictive environmental modeling, and automated reporting systems for environmental compliance.",
+        synopsis="Green AI: Satellite analysis, IoT sensors, environmental modeling",
+        total_budget=3000000,
+        min_funding_amount=100000,
+        max_funding_amount=400000,
+        _deadline_days=75,
+        _start_days=150,
+        _end_days=150 + 720,  # 2 years
+        project_duration_months=24,
+        eligible_countries=["DE", "FR", "IT", "ES", "NL", "BE", "AT", "SE", "DK", "FI", "PT", "GR"],
+        target_organizations=["SME", "Environmental Company", "Technology Provider"],
+        keywords=["environmental monitoring", "ai", "satellite data", "iot", "sustainability"],
+        technology_areas=["AI", "Environmental", "Satellite"],
+        industry_sectors=["Environment", "Technology", "Sustainability"],
+        url="https://ec.europa.eu/environment/life/",
+        source_system="life_programme",
+        complexity_score=70.0
+    ),
+    dict(
+        grant_id="EIC-2024-ACCELERATOR-003",
+        title="Deep Tech AI Startups Accelerator",
+        program="EIC Accelerator",
+        description="Supporting deep tech startups leveraging AI for breakthrough innovations. Focus on companies developing novel AI applications in robotics, autonomous systems, advanced materials, and quantum computing applications.",
+        synopsis="Deep tech AI: robotics, autonomous systems, quantum computing",
+        total_budget=15000000,
+        min_funding_amount=500000,
+        max_funding_amount=2500000,
+        _deadline_days=90,
+        _start_days=180,
+        _end_days=180 + 1095,  # 3 years
+        project_duration_months=36,
+        eligible_countries=["ALL_EU"],
+        target_organizations=["SME", "Startup", "Deep Tech Company"],
+        keywords=["deep tech", "ai", "robotics", "autonomous systems", "quantum computing", "breakthrough innovation"],
+        technology_areas=["AI", "Robotics", "Quantum", "Deep Tech"],
+        industry_sectors=["Technology", "Research", "Innovation"],
+        url="https://eic.ec.europa.eu/eic-funding-opportunities/eic-accelerator_en",
+        source_system="eic_accelerator",
+        complexity_score=85.0
+    ),
+    dict(
+        grant_id="EUREKA-2024-AI-005",
+        title="AI for Sustainable Energy Solutions",
+        program="Eureka",
+        description="International collaboration program supporting AI applications in renewable energy, smart grids, energy efficiency optimization, and sustainable energy storage solutions for SMEs across Europe.",
+        synopsis="Sustainable AI: renewable energy, smart grids, energy efficiency",
+        total_budget=8000000,
+        min_funding_amount=200000,
+        max_funding_amount=800000,
+        _deadline_days=120,
+        _start_days=210,
+        _end_days=210 + 912,  # 2.5 years
+        project_duration_months=30,
+        eligible_countries=["DE", "FR", "IT", "ES", "NL", "BE", "AT", "SE", "DK", "FI", "NO", "CH"],
+        target_organizations=["SME", "Energy Company", "Technology Provider", "Research Institute"],
+        keywords=["sustainable energy", "ai", "renewable energy", "smart grids", "energy efficiency"],
+        technology_areas=["AI", "Energy", "Sustainability"],
+        industry_sectors=["Energy", "Technology", "Sustainability"],
+        url="https://www.eurekanetwork.org/",
+        source_system="eureka",
+        complexity_score=75.0
+    )
+)
+
+
+def sample_grant_rows(now):
+    """Materialize _SAMPLE_GRANTS as insertable rows dated relative to `now`."""
+    from app.models import GrantStatus
+    
+    rows = []
+    for grant in _SAMPLE_GRANTS:
+        row = dict(grant)
+        row["deadline"] = now + timedelta(days=row.pop("_deadline_days"))
+        row["project_start_date"] = now + timedelta(days=row.pop("_start_days"))
+        row["project_end_date"] = now + timedelta(days=row.pop("_end_days"))
+        row["status"] = GrantStatus.OPEN
+        rows.append(row)
+    return rows
+
+
+def has_python_default(column):
+    """Whether the column has a scalar or callable default evaluated in Python."""
+    return column.default is not None and (column.default.is_scalar or column.default.is_callable)
+
+
+def bind_column_values(column, values, dialect):
+    """Prepare one column's values for COPY the way an INSERT would bind them.
+    
+    Missing values take the column's Python-side default, called per row when
+    it is a callable such as datetime.utcnow; the type's own bind processing
+    turns enums into their database labels and JSON into text.
+    """
+    default = column.default if has_python_default(column) else None
+    process = column.type.bind_processor(dialect)
+    if default is None and process is None:
+        return values
+    
+    prepared = []
+    for value in values:
+        if value is None and default is not None:
+            # SQLAlchemy wraps callable defaults to take an execution context
+            value = default.arg(None) if default.is_callable else default.arg
+        prepared.append(process(value) if process and value is not None else value)
+    return prepared
+
+
+async def bulk_copy_grants(db, rows):
+    """Insert many grant rows at once, e.g. for CSV grant imports.
+    
+    All rows must have the same keys. The caller commits.
+    """
+    from sqlalchemy import insert
+    from app.models import Grant
+    
+    if not rows:
+        return
+    
+    dialect = db.get_bind().dialect
+    if len(rows) < BULK_COPY_THRESHOLD or dialect.driver != "asyncpg":
+        # Batched into multi-row INSERTs by SQLAlchemy's insertmanyvalues
+        await db.execute(insert(Grant), rows)
+        return
+    
+    # Columns given in the rows, plus those with a Python-side default that
+    # COPY would otherwise leave NULL
+    given = [column for column in Grant.__table__.columns if column.name in rows[0]]
+    defaulted = [
+        column for column in Grant.__table__.columns
+        if column.name not in rows[0] and has_python_default(column)
+    ]
+    columns = given + defaulted
+    
+    # Each row's values come out in one C-level itemgetter call; they are
+    # then converted a column at a time
+    get_values = itemgetter(*(column.name for column in given))
+    column_values = [
+        bind_column_values(column, values, dialect)
+        for column, values in zip(given, zip(*map(get_values, rows)))
+    ]
+    column_values.extend(
+        bind_column_values(column, [None] * len(rows), dialect) for column in defaulted
+    )
+    records = list(zip(*column_values))
+    
+    connection = await db.connection()
+    raw_connection = await connection.get_raw_connection()
+    await raw_connection.driver_connection.copy_records_to_table(
+        Grant.__tablename__,
+        records=records,
+        columns=[column.name for column in columns]
+    )
+
+
 async def seed_database():
     """Seed the database with sample grant data."""
     print(f"\n🌱 Seeding database with sample data...")
     
     try:
         from app.database import get_async_db
-        from app.models import Grant, GrantStatus
+        from app.models import Grant
         
         # Get database session
         db_gen = get_async_db()
         db = await db_gen.__anext__()
         
         try:
-            # Check if we already have grants
-            from sqlalchemy import select
-            result = await db.execute(select(Grant).limit(1))
-            existing_grant = result.scalar_one_or_none()
+            # Check if we already have grants (without loading a Grant row)
+            from sqlalchemy import literal, select
+            result = await db.execute(select(literal(1)).select_from(Grant).limit(1))
+            has_grants = result.scalar() is not None
             
-            if existing_grant:
+            if has_grants:
                 print("📊 Database already contains grant data, skipping seed")
                 return True
             
-            # Create sample grants
-            sample_grants = [
-                Grant(
-                    grant_id="HE-2024-AI-001",
-                    title="AI for Healthcare SMEs",
-                    program="Horizon Europe",
-                    description="This call supports Small and Medium Enterprises (SMEs) in developing artificial intelligence solutions for healthcare applications. Focus areas include machine learning for medical diagnosis, natural language processing for clinical documentation, and computer vision for medical imaging.",
-                    synopsis="AI solutions for healthcare: ML diagnosis, NLP clinical docs, CV medical imaging",
-                    total_budget=10000000,
-                    min_funding_amount=50000,
-                    max_funding_amount=500000,
-                    deadline=datetime.now() + timedelta(days=45),
-                    project_start_date=datetime.now() + timedelta(days=120),
-                    project_end_date=datetime.now() + timedelta(days=120 + 730),  # 2 years
-                    project_duration_months=24,
-                    eligible_countries=["DE", "FR", "IT", "ES", "NL", "BE", "AT", "SE", "DK", "FI"],
-                    target_organizations=["SME", "Small Enterprise", "Medium Enterprise"],
-                    keywords=["artificial intelligence", "healthcare", "machine learning", "medical diagnosis", "clinical validation"],
-                    technology_areas=["AI", "Healthcare", "Machine Learning"],
-                    industry_sectors=["Healthcare", "Technology"],
-                    url="https://ec.europa.eu/info/funding-tenders/opportunities/portal/screen/opportunities/topic-details/HORIZON-EIC-2024-PATHFINDEROPEN-01",
-                    documents_url="https://ec.europa.eu/info/funding-tenders/opportunities/documents",
-                    status=GrantStatus.OPEN,
-                    source_system="horizon_europe",
-                    complexity_score=65.0
-                ),
-                Grant(
-                    grant_id="DIGITAL-EU-2024-002",
-                    title="Digital Innovation for Manufacturing SMEs",
-                    program="Digital Europe",
-                    description="Supporting digital transformation in European manufacturing through Industry 4.0 technologies. This call targets SMEs developing solutions in areas such as IoT integration, predictive maintenance using AI, automated quality control, and supply chain optimization.",
-                    synopsis="Industry 4.0: IoT, AI predictive maintenance, automated quality control",
-                    total_budget=5000000,
-                    min_funding_amount=75000,
-                    max_funding_amount=300000,
-                    deadline=datetime.now() + timedelta(days=60),
-                    project_start_date=datetime.now() + timedelta(days=90),
-                    project_end_date=datetime.now() + timedelta(days=90 + 540),  # 18 months
-                    project_duration_months=18,
-                    eligible_countries=["DE", "FR", "IT", "ES", "PL", "CZ", "HU", "SK"],
-                    target_organizations=["SME", "Manufacturing Company", "Technology Provider"],
-                    keywords=["digital transformation", "industry 40", "iot", "predictive maintenance", "automation"],
-                    technology_areas=["IoT", "AI", "Manufacturing"],
-                    industry_sectors=["Manufacturing", "Technology"],
-                    url="https://digital-strategy.ec.europa.eu/en/activities/digital-programme",
-                    status=GrantStatus.OPEN,
-                    source_system="digital_europe",
-                    complexity_score=55.0
-                ),
-                Grant(
-                    grant_id="LIFE-2024-GREEN-004",
-                    title="AI-Powered Environmental Monitoring Solutions",
-                    program="Life",
-                    description="Developing AI solutions for environmental monitoring and protection. Focus on satellite data analysis, IoT sensor networks, predictive environmental modeling, and automated reporting systems for environmental compliance.",
-                    synopsis="Green AI: Satellite analysis, IoT sensors, environmental modeling",
-                    total_budget=3000000,
-                    min_funding_amount=100000,
-                    max_funding_amount=400000,
-                    deadline=datetime.now() + timedelta(days=75),
-                    project_start_date=datetime.now() + timedelta(days=150),
-                    project_end_date=datetime.now() + timedelta(days=150 + 720),  # 2 years
-                    project_duration_months=24,
-                    eligible_countries=["DE", "FR", "IT", "ES", "NL", "BE", "AT", "SE", "DK", "FI", "PT", "GR"],
-                    target_organizations=["SME", "Environmental Company", "Technology Provider"],
-                    keywords=["environmental monitoring", "ai", "satellite data", "iot", "sustainability"],
-                    technology_areas=["AI", "Environmental", "Satellite"],
-                    industry_sectors=["Environment", "Technology", "Sustainability"],
-                    url="https://ec.europa.eu/environment/life/",
-                    status=GrantStatus.OPEN,
-                    source_system="life_programme",
-                    complexity_score=70.0
-                ),
-                Grant(
-                    grant_id="EIC-2024-ACCELERATOR-003",
-                    title="Deep Tech AI Startups Accelerator",
-                    program="EIC Accelerator",
-                    description="Supporting deep tech startups leveraging AI for breakthrough innovations. Focus on companies developing novel AI applications in robotics, autonomous systems, advanced materials, and quantum computing applications.",
-                    synopsis="Deep tech AI: robotics, autonomous systems, quantum computing",
-                    total_budget=15000000,
-                    min_funding_amount=500000,
-                    max_funding_amount=2500000,
-                    deadline=datetime.now() + timedelta(days=90),
-                    project_start_date=datetime.now() + timedelta(days=180),
-                    project_end_date=datetime.now() + timedelta(days=180 + 1095),  # 3 years
-                    project_duration_months=36,
-                    eligible_countries=["ALL_EU"],
-                    target_organizations=["SME", "Startup", "Deep Tech Company"],
-                    keywords=["deep tech", "ai", "robotics", "autonomous systems", "quantum computing", "breakthrough innovation"],
-                    technology_areas=["AI", "Robotics", "Quantum", "Deep Tech"],
-                    industry_sectors=["Technology", "Research", "Innovation"],
-                    url="https://eic.ec.europa.eu/eic-funding-opportunities/eic-accelerator_en",
-                    status=GrantStatus.OPEN,
-                    source_system="eic_accelerator",
-                    complexity_score=85.0
-                ),
-                Grant(
-                    grant_id="EUREKA-2024-AI-005",
-                    title="AI for Sustainable Energy Solutions",
-                    program="Eureka",
-                    description="International collaboration program supporting AI applications in renewable energy, smart grids, energy efficiency optimization, and sustainable energy storage solutions for SMEs across Europe.",
-                    synopsis="Sustainable AI: renewable energy, smart grids, energy efficiency",
-                    total_budget=8000000,
-                    min_funding_amount=200000,
-                    max_funding_amount=800000,
-                    deadline=datetime.now() + timedelta(days=120),
-                    project_start_date=datetime.now() + timedelta(days=210),
-                    project_end_date=datetime.now() + timedelta(days=210 + 912),  # 2.5 years
-                    project_duration_months=30,
-                    eligible_countries=["DE", "FR", "IT", "ES", "NL", "BE", "AT", "SE", "DK", "FI", "NO", "CH"],
-                    target_organizations=["SME", "Energy Company", "Technology Provider", "Research Institute"],
-                    keywords=["sustainable energy", "ai", "renewable energy", "smart grids", "energy efficiency"],
-                    technology_areas=["AI", "Energy", "Sustainability"],
-                    industry_sectors=["Energy", "Technology", "Sustainability"],
-                    url="https://www.eurekanetwork.org/",
-                    status=GrantStatus.OPEN,
-                    source_system="eureka",
-                    complexity_score=75.0
-                )
-            ]
+            # Create sample grants as plain rows
+            sample_grants = sample_grant_rows(datetime.now())
             
-            # Add grants to session
-            for grant in sample_grants:
-                db.add(grant)
+            # One bulk load instead of adding ORM objects one by one
+            await bulk_copy_grants(db, sample_grants)
             
             # Commit the transaction
             await db.commit()
@@ -241,13 +338,30 @@ async def seed_database():
 
 async def main():
     """Main initialization function."""
+    # Output is written out once per step (see the flushes in initialize)
+    # rather than on every line
+    sys.stdout.reconfigure(line_buffering=False)
+    try:
+        await initialize()
+    finally:
+        # Close the shared pool's connections before the event loop goes away
+        # (without importing the app's models on runs that never got that far)
+        database = sys.modules.get("app.database")
+        engine = database.get_async_engine() if database else None
+        if engine is not None:
+            await engine.dispose()
+
+
+async def initialize():
+    """Run the initialization steps in order."""
     print("🚀 EU GRANTS MONITOR - DATABASE INITIALIZATION")
     print("=" * 60)
     
     # Step 1: Test database connection
     print("\n📋 STEP 1: TEST DATABASE CONNECTION")
     print("-" * 40)
-    if not test_database_connection():
+    sys.stdout.flush()
+    if not await test_database_connection():
         print("\n❌ Cannot connect to database. Please fix connection issues first.")
         print("\n🔧 Quick fixes to try:")
         print("   1. Wait 2-3 minutes for Supabase project to fully initialize")
@@ -258,6 +372,7 @@ async def main():
     # Step 2: Run migrations
     print("\n📋 STEP 2: CREATE DATABASE SCHEMA")
     print("-" * 40)
+    sys.stdout.flush()
     if not run_migrations():
         print("\n❌ Database migration failed.")
         print("\n🔧 You can try running migrations manually:")
@@ -267,6 +382,7 @@ async def main():
     # Step 3: Seed database
     print("\n📋 STEP 3: SEED WITH SAMPLE DATA")
     print("-" * 40)
+    sys.stdout.flush()
     if not await seed_database():
         print("\n⚠️  Database seeding failed, but schema is created.")
         print("   You can add grants manually through the API later.")
@@ -1,50 +1,501 @@
 """
-Quick migration script to add hashed_password column to users table.
+Schema migrations, applied in order over a single asyncpg connection.
+Run once per deploy (Railway's preDeployCommand); exits non-zero if any fails.
 """
+import asyncio
 import os
-import psycopg2
-from psycopg2.extras import RealDictCursor
+import sys
+from urllib.parse import urlsplit
 
-def add_hashed_password_column():
+import asyncpg
+
+# DDL run through execute_with_lock_retry waits at most this long for its
+# table lock instead of queueing (and blocking every query behind it) while a
+# long-running query holds the table. Scoped to those statements only: a
+# CREATE INDEX CONCURRENTLY that timed out would leave an invalid index behind
+# that IF NOT EXISTS then skips on every later deploy
+LOCK_TIMEOUT = "2s"
+LOCK_RETRIES = 3
+
+async def execute_with_lock_retry(conn, sql):
+    """Run a statement, retrying with a short backoff when its lock times out."""
+    await conn.execute(f"SET lock_timeout = '{LOCK_TIMEOUT}'")
+    try:
+        for attempt in range(1, LOCK_RETRIES + 1):
+            try:
+                return await conn.execute(sql)
+            except asyncpg.exceptions.LockNotAvailableError:
+                if attempt == LOCK_RETRIES:
+                    raise
+                print(f"Table is busy, retrying ({attempt}/{LOCK_RETRIES - 1})")
+                await asyncio.sleep(attempt)
+    finally:
+        await conn.execute("RESET lock_timeout")
+
+async def add_hashed_password_column(conn):
     """Add hashed_password column to users table."""
-    database_url = os.getenv("DATABASE_URL") or os.getenv("SUPABASE_DATABASE_URL")
-    if not database_url:
-        print("DATABASE_URL or SUPABASE_DATABASE_URL environment variable not set")
+    try:
+        # IF NOT EXISTS makes this a no-op once the column is there, so no
+        # catalog lookup is needed first; a nullable column without a default
+        # is a catalog-only change, committed on its own outside a transaction
+        await execute_with_lock_retry(conn, """
+            ALTER TABLE users
+            ADD COLUMN IF NOT EXISTS hashed_password VARCHAR(255) NULL
+        """)
+        
+        print("hashed_password column is in place on the users table")
+        return True
+    
+    except Exception as e:
+        print(f"Error adding hashed_password column: {e}")
+        return False
+
+async def add_search_vector_column(conn):
+    """Replace grants.search_vector with a generated tsvector column and GIN index."""
+    try:
+        # The old TEXT column was never populated, so it can simply be replaced
+        data_type = await conn.fetchval("""
+            SELECT data_type
+            FROM information_schema.columns
+            WHERE table_name = 'grants' AND column_name = 'search_vector'
+        """)
+        if data_type == "tsvector":
+            print("search_vector column already migrated")
+            return True
+        
+        async with conn.transaction():
+            await conn.execute("""
+                ALTER TABLE grants
+                DROP COLUMN IF EXISTS search_vector,
+                ADD COLUMN search_vector tsvector GENERATED ALWAYS AS (
+                    to_tsvector('english', coalesce(title, '') || ' ' || coalesce(synopsis, '') || ' ' || coalesce(description, ''))
+                ) STORED
+            """)
+            await conn.execute("""
+                CREATE INDEX IF NOT EXISTS idx_grants_search_vector
+                ON grants USING gin(search_vector)
+            """)
+        
+        print("Successfully added generated search_vector column to grants table")
+        return True
+    
+    except Exception as e:
+        print(f"Error adding search_vector column: {e}")
+        return False
+
+async def add_trigram_indexes(conn):
+    """Add pg_trgm indexes for substring filters on grants program, title, synopsis and description."""
+    try:
+        async with conn.transaction():
+            await conn.execute("CREATE EXTENSION IF NOT EXISTS pg_trgm")
+            await conn.execute("""
+                CREATE INDEX IF NOT EXISTS idx_grants_program_trgm
+                ON grants USING gin(program gin_trgm_ops)
+            """)
+            await conn.execute("""
+                CREATE INDEX IF NOT EXISTS idx_grants_title_trgm
+                ON grants USING gin(title gin_trgm_ops)
+            """)
+            await conn.execute("""
+                CREATE INDEX IF NOT EXISTS idx_grants_synopsis_trgm
+                ON grants USING gin(synopsis gin_trgm_ops)
+            """)
+            await conn.execute("""
+                CREATE INDEX IF NOT EXISTS idx_grants_description_trgm
+                ON grants USING gin(description gin_trgm_ops)
+            """)
+        
+        print("Successfully added trigram indexes to grants table")
+        return True
+    
+    except Exception as e:
+        print(f"Error adding trigram indexes: {e}")
         return False
+
+async def convert_to_jsonb(conn, table, column):
+    """Retype a json column as jsonb, skipping columns that already are."""
+    data_type = await conn.fetchval("""
+        SELECT data_type
+        FROM information_schema.columns
+        WHERE table_name = $1 AND column_name = $2
+    """, table, column)
+    if not data_type or data_type == "jsonb":
+        return
+    
+    # Not a no-op even between identical types: takes an ACCESS EXCLUSIVE
+    # lock and rewrites the whole table
+    await conn.execute(
+        f"ALTER TABLE {table} ALTER COLUMN {column} TYPE jsonb USING {column}::jsonb"
+    )
+
+async def add_array_filter_indexes(conn):
+    """Store the filterable grant/company arrays as jsonb and add GIN indexes on them."""
+    columns = (
+        "eligible_countries", "target_organizations", "keywords",
+        "technology_areas", "industry_sectors",
+    )
+    # Only matched by containment, so the smaller jsonb_path_ops indexes do
+    containment_columns = (
+        ("grants", "topics"),
+        ("companies", "ai_expertise"),
+        ("companies", "technology_focus"),
+    )
     
     try:
-        # Connect to the database
-        conn = psycopg2.connect(database_url)
-        cursor = conn.cursor()
+        async with conn.transaction():
+            for column in columns:
+                await convert_to_jsonb(conn, "grants", column)
+                await conn.execute(
+                    f"CREATE INDEX IF NOT EXISTS idx_grants_{column} ON grants USING gin({column})"
+                )
+            
+            for table, column in containment_columns:
+                await convert_to_jsonb(conn, table, column)
+                await conn.execute(
+                    f"CREATE INDEX IF NOT EXISTS idx_{table}_{column} "
+                    f"ON {table} USING gin({column} jsonb_path_ops)"
+                )
         
-        # Check if column already exists
-        cursor.execute("""
-            SELECT column_name 
-            FROM information_schema.columns 
-            WHERE table_name = 'users' AND column_name = 'hashed_password'
+        print("Successfully added GIN indexes on grant and company array columns")
+        return True
+    
+    except Exception as e:
+        print(f"Error adding array column indexes: {e}")
+        return False
+
+async def add_listing_indexes(conn):
+    """Add the composite indexes behind status-filtered, sorted grant listings."""
+    try:
+        # schema.sql labels the enum 'open'; create_all() labels it 'OPEN'
+        open_label = await conn.fetchval("""
+            SELECT e.enumlabel
+            FROM pg_enum e JOIN pg_type t ON t.oid = e.enumtypid
+            WHERE t.typname = 'grantstatus' AND lower(e.enumlabel) = 'open'
         """)
+        if not open_label:
+            print("grantstatus enum not found")
+            return False
         
-        if cursor.fetchone():
-            print("hashed_password column already exists")
-            return True
+        async with conn.transaction():
+            await conn.execute(f"""
+                CREATE INDEX IF NOT EXISTS idx_grants_open_deadline_id
+                ON grants(deadline, id) WHERE status = '{open_label}'
+            """)
+            await conn.execute("""
+                CREATE INDEX IF NOT EXISTS idx_grants_status_created_at
+                ON grants(status, created_at DESC)
+            """)
+            await conn.execute("""
+                CREATE INDEX IF NOT EXISTS idx_grants_program_deadline
+                ON grants(program, deadline)
+            """)
         
-        # Add the column if it doesn't exist
-        cursor.execute("""
-            ALTER TABLE users 
-            ADD COLUMN IF NOT EXISTS hashed_password VARCHAR(255) NULL
-        """)
+        print("Successfully added grant listing indexes")
+        return True
+    
+    except Exception as e:
+        print(f"Error adding grant listing indexes: {e}")
+        return False
+
+async def convert_payment_enum_columns(conn):
+    """Store payment_transactions status and product_type as enums instead of varchar."""
+    enum_columns = (
+        ("status", "paymentstatus", ("pending", "succeeded", "failed", "cancelled")),
+        ("product_type", "producttype", ("monthly", "yearly", "per_application")),
+    )
+    
+    try:
+        async with conn.transaction():
+            for column, type_name, labels in enum_columns:
+                udt_name = await conn.fetchval("""
+                    SELECT udt_name
+                    FROM information_schema.columns
+                    WHERE table_name = 'payment_transactions' AND column_name = $1
+                """, column)
+                if udt_name == type_name:
+                    print(f"payment_transactions.{column} is already {type_name}")
+                    continue
+                
+                if not await conn.fetchval("SELECT 1 FROM pg_type WHERE typname = $1", type_name):
+                    label_list = ", ".join(f"'{label}'" for label in labels)
+                    await conn.execute(f"CREATE TYPE {type_name} AS ENUM ({label_list})")
+                
+                # The varchar default can't be cast in place
+                await conn.execute(f"ALTER TABLE payment_transactions ALTER COLUMN {column} DROP DEFAULT")
+                await conn.execute(
+                    f"ALTER TABLE payment_transactions ALTER COLUMN {column} "
+                    f"TYPE {type_name} USING {column}::{type_name}"
+                )
+            
+            await conn.execute("ALTER TABLE payment_transactions ALTER COLUMN status SET DEFAULT 'pending'")
         
-        conn.commit()
-        print("Successfully added hashed_password column to users table")
+        print("Successfully converted payment_transactions columns to enums")
         return True
+    
+    except Exception as e:
+        print(f"Error converting payment_transactions columns: {e}")
+        return False
+
+async def add_composite_indexes(conn):
+    """Add the multi-column indexes behind user, application and payment lookups."""
+    indexes = (
+        "idx_users_active_subscription ON users(is_active, subscription_status)",
+        "idx_applications_user_status ON applications(user_id, status)",
+        "idx_applications_company_status ON applications(company_id, status)",
+        "idx_payment_transactions_user_status ON payment_transactions(user_id, status)",
+        "idx_payment_transactions_pending_created_at ON payment_transactions(created_at) "
+        "WHERE status = 'pending'",
+    )
+    
+    try:
+        # CREATE INDEX CONCURRENTLY can't run inside a transaction, and doesn't
+        # block writes to these live tables while it builds; outside
+        # conn.transaction() each statement commits on its own
+        for index in indexes:
+            # A concurrent build that failed part-way leaves an INVALID index
+            # that IF NOT EXISTS would skip forever; drop it and build again
+            index_name = index.split()[0]
+            is_valid = await conn.fetchval("""
+                SELECT i.indisvalid
+                FROM pg_index i JOIN pg_class c ON c.oid = i.indexrelid
+                WHERE c.relname = $1
+            """, index_name)
+            if is_valid is False:
+                print(f"Rebuilding invalid index {index_name}")
+                await conn.execute(f"DROP INDEX CONCURRENTLY IF EXISTS {index_name}")
+            
+            await conn.execute(f"CREATE INDEX CONCURRENTLY IF NOT EXISTS {index}")
         
+        print("Successfully added composite indexes")
+        return True
+    
     except Exception as e:
-        print(f"Error adding hashed_password column: {e}")
+        print(f"Error adding composite indexes: {e}")
+        return False
+
+# schema.sql's RLS policies that read id columns; Postgres refuses to change
+# the type of a column a policy depends on, so these are dropped and
+# recreated verbatim around the ALTERs
+ID_COLUMN_POLICIES = (
+    ("users_own_data", "users", """
+        CREATE POLICY users_own_data ON users
+            FOR ALL USING (auth.uid()::text = id::text)
+    """),
+    ("company_members", "companies", """
+        CREATE POLICY company_members ON companies
+            FOR ALL USING (
+                id IN (
+                    SELECT company_id FROM users 
+                    WHERE auth.uid()::text = users.id::text 
+                    AND company_id IS NOT NULL
+                )
+            )
+    """),
+    ("applications_own_company", "applications", """
+        CREATE POLICY applications_own_company ON applications
+            FOR ALL USING (
+                user_id IN (
+                    SELECT id FROM users 
+                    WHERE auth.uid()::text = users.id::text
+                )
+                OR
+                company_id IN (
+                    SELECT company_id FROM users 
+                    WHERE auth.uid()::text = users.id::text 
+                    AND company_id IS NOT NULL
+                )
+            )
+    """),
+    ("payment_transactions_own", "payment_transactions", """
+        CREATE POLICY payment_transactions_own ON payment_transactions
+            FOR ALL USING (
+                user_id IN (
+                    SELECT id FROM users 
+                    WHERE auth.uid()::text = users.id::text
+                )
+            )
+    """),
+)
+
+async def widen_id_columns(conn):
+    """Switch primary keys and the foreign keys pointing at them to bigint."""
+    id_columns = (
+        ("companies", "id"),
+        ("users", "id"),
+        ("users", "company_id"),
+        ("grants", "id"),
+        ("applications", "id"),
+        ("applications", "user_id"),
+        ("applications", "company_id"),
+        ("applications", "grant_id"),
+        ("payment_transactions", "id"),
+        ("payment_transactions", "user_id"),
+    )
+    
+    try:
+        async with conn.transaction():
+            to_widen = []
+            for table, column in id_columns:
+                data_type = await conn.fetchval("""
+                    SELECT data_type
+                    FROM information_schema.columns
+                    WHERE table_name = $1 AND column_name = $2
+                """, table, column)
+                if data_type and data_type != "bigint":
+                    to_widen.append((table, column))
+            
+            if to_widen:
+                # Only policies that exist are recreated; a create_all() schema has none
+                existing_policies = {
+                    row["policyname"] for row in await conn.fetch("""
+                        SELECT policyname
+                        FROM pg_policies
+                        WHERE policyname = ANY($1::text[])
+                    """, [name for name, _, _ in ID_COLUMN_POLICIES])
+                }
+                for name, table, _ in ID_COLUMN_POLICIES:
+                    if name in existing_policies:
+                        await conn.execute(f"DROP POLICY {name} ON {table}")
+                
+                for table, column in to_widen:
+                    # Rewrites the table under an exclusive lock; cheap while tables are small
+                    await conn.execute(f"ALTER TABLE {table} ALTER COLUMN {column} TYPE bigint")
+                    if column == "id":
+                        # SERIAL sequences are created AS integer and would still cap at 2^31
+                        await conn.execute(f"ALTER SEQUENCE IF EXISTS {table}_id_seq AS bigint")
+                
+                for name, _, create_policy in ID_COLUMN_POLICIES:
+                    if name in existing_policies:
+                        await conn.execute(create_policy)
+        
+        print("Successfully widened id columns to bigint")
+        return True
+    
+    except Exception as e:
+        print(f"Error widening id columns: {e}")
+        return False
+
+async def drop_redundant_indexes(conn):
+    """Drop schema.sql indexes already covered by a unique constraint or a wider index."""
+    redundant_indexes = (
+        # Duplicates of the UNIQUE constraints' own indexes
+        "idx_users_email",
+        "idx_users_google_id",
+        "idx_users_microsoft_id",
+        "idx_grants_grant_id",
+        # Leading columns of composite indexes
+        "idx_grants_deadline",
+        "idx_grants_status",
+        "idx_grants_program",
+        "idx_applications_user_id",
+        "idx_applications_company_id",
+        "idx_payment_transactions_user_id",
+    )
+    
+    try:
+        # DROP INDEX CONCURRENTLY can't run inside a transaction either
+        for index in redundant_indexes:
+            await conn.execute(f"DROP INDEX CONCURRENTLY IF EXISTS {index}")
+        
+        print("Successfully dropped redundant indexes")
+        return True
+    
+    except Exception as e:
+        print(f"Error dropping redundant indexes: {e}")
         return False
+
+async def convert_percentage_columns(conn):
+    """Store percentages and 0-100 scores as NUMERIC(5,2) instead of double precision."""
+    percentage_columns = (
+        ("companies", "profile_completion_percentage"),
+        ("grants", "funding_rate"),
+        ("grants", "complexity_score"),
+        ("grants", "estimated_success_rate"),
+        ("applications", "form_completion_percentage"),
+        ("applications", "evaluation_score"),
+    )
+    
+    try:
+        async with conn.transaction():
+            for table, column in percentage_columns:
+                data_type = await conn.fetchval("""
+                    SELECT data_type
+                    FROM information_schema.columns
+                    WHERE table_name = $1 AND column_name = $2
+                """, table, column)
+                if not data_type or data_type == "numeric":
+                    continue
+                
+                await conn.execute(
+                    f"ALTER TABLE {table} ALTER COLUMN {column} "
+                    f"TYPE numeric(5,2) USING round({column}::numeric, 2)"
+                )
         
+        print("Successfully converted percentage columns to numeric(5,2)")
+        return True
+    
+    except Exception as e:
+        print(f"Error converting percentage columns: {e}")
+        return False
+
+# Applied in this order, one after another
+MIGRATIONS = (
+    add_hashed_password_column,
+    add_search_vector_column,
+    add_trigram_indexes,
+    add_array_filter_indexes,
+    add_listing_indexes,
+    convert_payment_enum_columns,
+    add_composite_indexes,
+    widen_id_columns,
+    drop_redundant_indexes,
+    convert_percentage_columns,
+)
+
+async def run_migrations(conn):
+    """Apply every migration over an open asyncpg connection; True if all succeeded."""
+    results = []
+    for migration in MIGRATIONS:
+        results.append(await migration(conn))
+    return all(results)
+
+def is_transaction_pooler(database_url):
+    """Whether the URL points at Supabase's transaction-mode pooler (port 6543)."""
+    # The session-mode pooler on 5432 keeps one backend per client, which is
+    # all these migrations need
+    return urlsplit(database_url).port == 6543
+
+async def main():
+    """Connect once and run all migrations on that connection."""
+    # DIRECT_DATABASE_URL lets the app keep using the transaction pooler while
+    # migrations go through a direct or session-mode connection
+    database_url = (
+        os.getenv("DIRECT_DATABASE_URL")
+        or os.getenv("DATABASE_URL")
+        or os.getenv("SUPABASE_DATABASE_URL")
+    )
+    if not database_url:
+        print("DIRECT_DATABASE_URL, DATABASE_URL or SUPABASE_DATABASE_URL environment variable not set")
+        sys.exit(1)
+    
+    # The transaction pooler hands each transaction a different backend: asyncpg's cached
+    # prepared statements break, and a session-level SET lock_timeout doesn't
+    # carry over to the next statement
+    if is_transaction_pooler(database_url):
+        print("Migrations can't run through the transaction-mode pooler (port 6543); "
+              "set DIRECT_DATABASE_URL to the direct or session-mode (port 5432) URL")
+        sys.exit(1)
+    
+    conn = await asyncpg.connect(database_url)
+    try:
+        succeeded = await run_migrations(conn)
     finally:
-        if 'conn' in locals():
-            conn.close()
+        await conn.close()
+    
+    if not succeeded:
+        # Non-zero exit makes Railway's preDeployCommand abort the deploy
+        print("One or more migrations failed")
+        sys.exit(1)
 
 if __name__ == "__main__":
-    add_hashed_password_column()
+    asyncio.run(main())
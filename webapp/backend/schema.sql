@@ -2,16 +2,21 @@
 -- Execute this in your Supabase SQL Editor to create all tables
 -- Dashboard: https://iabempablugdcjhrylkv.supabase.co -> SQL Editor
 
+-- Trigram indexes back the substring (ILIKE '%...%') filters
+CREATE EXTENSION IF NOT EXISTS pg_trgm;
+
 -- Create custom enum types
 CREATE TYPE userrole AS ENUM ('user', 'company_admin', 'system_admin');
 CREATE TYPE subscriptionstatus AS ENUM ('free', 'monthly', 'yearly', 'pay_per_use', 'cancelled');
 CREATE TYPE companysize AS ENUM ('micro', 'small', 'medium', 'large');
 CREATE TYPE grantstatus AS ENUM ('open', 'closed', 'upcoming', 'cancelled');
 CREATE TYPE applicationstatus AS ENUM ('draft', 'in_progress', 'review', 'submitted', 'accepted', 'rejected', 'withdrawn');
+CREATE TYPE paymentstatus AS ENUM ('pending', 'succeeded', 'failed', 'cancelled');
+CREATE TYPE producttype AS ENUM ('monthly', 'yearly', 'per_application');
 
 -- Create users table
 CREATE TABLE users (
-    id SERIAL PRIMARY KEY,
+    id BIGINT GENERATED BY DEFAULT AS IDENTITY PRIMARY KEY,
     email VARCHAR(255) NOT NULL UNIQUE,
     full_name VARCHAR(255) NOT NULL,
     profile_picture_url VARCHAR(500),
@@ -29,17 +34,15 @@ CREATE TABLE users (
     created_at TIMESTAMPTZ DEFAULT NOW(),
     updated_at TIMESTAMPTZ,
     last_login TIMESTAMPTZ,
-    company_id INTEGER
+    company_id BIGINT
 );
 
 -- Create indexes for users
-CREATE INDEX idx_users_email ON users(email);
-CREATE INDEX idx_users_google_id ON users(google_id);
-CREATE INDEX idx_users_microsoft_id ON users(microsoft_id);
+CREATE INDEX idx_users_active_subscription ON users(is_active, subscription_status);
 
 -- Create companies table
 CREATE TABLE companies (
-    id SERIAL PRIMARY KEY,
+    id BIGINT GENERATED BY DEFAULT AS IDENTITY PRIMARY KEY,
     name VARCHAR(255) NOT NULL,
     description TEXT,
     website VARCHAR(255),
@@ -58,7 +61,7 @@ CREATE TABLE companies (
     preferred_funding_max INTEGER DEFAULT 500000,
     max_project_duration_months INTEGER DEFAULT 24,
     profile_completed BOOLEAN DEFAULT false,
-    profile_completion_percentage FLOAT DEFAULT 0.0,
+    profile_completion_percentage NUMERIC(5,2) DEFAULT 0.0,
     created_at TIMESTAMPTZ DEFAULT NOW(),
     updated_at TIMESTAMPTZ
 );
@@ -67,10 +70,12 @@ CREATE TABLE companies (
 CREATE INDEX idx_companies_name ON companies(name);
 CREATE INDEX idx_companies_country ON companies(country);
 CREATE INDEX idx_companies_size ON companies(size);
+CREATE INDEX idx_companies_ai_expertise ON companies USING gin(ai_expertise jsonb_path_ops);
+CREATE INDEX idx_companies_technology_focus ON companies USING gin(technology_focus jsonb_path_ops);
 
 -- Create grants table
 CREATE TABLE grants (
-    id SERIAL PRIMARY KEY,
+    id BIGINT GENERATED BY DEFAULT AS IDENTITY PRIMARY KEY,
     grant_id VARCHAR(255) NOT NULL UNIQUE,
     title VARCHAR(500) NOT NULL,
     program VARCHAR(100) NOT NULL,
@@ -78,7 +83,7 @@ CREATE TABLE grants (
     synopsis TEXT,
     objectives TEXT,
     total_budget INTEGER NOT NULL,
-    funding_rate FLOAT DEFAULT 70.0,
+    funding_rate NUMERIC(5,2) DEFAULT 70.0,
     min_funding_amount INTEGER,
     max_funding_amount INTEGER,
     publication_date TIMESTAMPTZ,
@@ -97,33 +102,42 @@ CREATE TABLE grants (
     documents_url VARCHAR(500),
     submission_url VARCHAR(500),
     status grantstatus DEFAULT 'open',
-    complexity_score FLOAT,
+    complexity_score NUMERIC(5,2),
     ai_relevance_keywords JSONB DEFAULT '[]'::jsonb,
-    estimated_success_rate FLOAT,
+    estimated_success_rate NUMERIC(5,2),
     source_system VARCHAR(100),
     source_url VARCHAR(500),
     last_updated TIMESTAMPTZ DEFAULT NOW(),
-    search_vector TEXT,
+    search_vector TSVECTOR GENERATED ALWAYS AS (
+        to_tsvector('english', coalesce(title, '') || ' ' || coalesce(synopsis, '') || ' ' || coalesce(description, ''))
+    ) STORED,
     created_at TIMESTAMPTZ DEFAULT NOW(),
     updated_at TIMESTAMPTZ
 );
 
 -- Create indexes for grants
-CREATE INDEX idx_grants_grant_id ON grants(grant_id);
-CREATE INDEX idx_grants_program ON grants(program);
-CREATE INDEX idx_grants_deadline ON grants(deadline);
-CREATE INDEX idx_grants_status ON grants(status);
-CREATE INDEX idx_grants_title ON grants USING gin(to_tsvector('english', title));
-CREATE INDEX idx_grants_description ON grants USING gin(to_tsvector('english', description));
+CREATE INDEX idx_grants_deadline_id ON grants(deadline, id);
+CREATE INDEX idx_grants_open_deadline_id ON grants(deadline, id) WHERE status = 'open';
+CREATE INDEX idx_grants_status_created_at ON grants(status, created_at DESC);
+CREATE INDEX idx_grants_program_deadline ON grants(program, deadline);
+CREATE INDEX idx_grants_search_vector ON grants USING gin(search_vector);
+CREATE INDEX idx_grants_program_trgm ON grants USING gin(program gin_trgm_ops);
+CREATE INDEX idx_grants_title_trgm ON grants USING gin(title gin_trgm_ops);
+CREATE INDEX idx_grants_synopsis_trgm ON grants USING gin(synopsis gin_trgm_ops);
+CREATE INDEX idx_grants_description_trgm ON grants USING gin(description gin_trgm_ops);
 CREATE INDEX idx_grants_keywords ON grants USING gin(keywords);
 CREATE INDEX idx_grants_technology_areas ON grants USING gin(technology_areas);
+CREATE INDEX idx_grants_eligible_countries ON grants USING gin(eligible_countries);
+CREATE INDEX idx_grants_industry_sectors ON grants USING gin(industry_sectors);
+CREATE INDEX idx_grants_target_organizations ON grants USING gin(target_organizations);
+CREATE INDEX idx_grants_topics ON grants USING gin(topics jsonb_path_ops);
 
 -- Create applications table
 CREATE TABLE applications (
-    id SERIAL PRIMARY KEY,
-    user_id INTEGER NOT NULL,
-    company_id INTEGER NOT NULL,
-    grant_id INTEGER NOT NULL,
+    id BIGINT GENERATED BY DEFAULT AS IDENTITY PRIMARY KEY,
+    user_id BIGINT NOT NULL,
+    company_id BIGINT NOT NULL,
+    grant_id BIGINT NOT NULL,
     project_title VARCHAR(500),
     project_summary TEXT,
     requested_amount INTEGER,
@@ -132,12 +146,12 @@ CREATE TABLE applications (
     submitted_at TIMESTAMPTZ,
     ai_assistant_used BOOLEAN DEFAULT false,
     ai_assistant_session_id VARCHAR(255),
-    form_completion_percentage FLOAT DEFAULT 0.0,
+    form_completion_percentage NUMERIC(5,2) DEFAULT 0.0,
     form_data JSONB DEFAULT '{}'::jsonb,
     generated_documents JSONB DEFAULT '[]'::jsonb,
     external_reference VARCHAR(255),
     submission_confirmation VARCHAR(255),
-    evaluation_score FLOAT,
+    evaluation_score NUMERIC(5,2),
     feedback_received TEXT,
     outcome_notes TEXT,
     created_at TIMESTAMPTZ DEFAULT NOW(),
@@ -148,30 +162,31 @@ CREATE TABLE applications (
 );
 
 -- Create indexes for applications
-CREATE INDEX idx_applications_user_id ON applications(user_id);
-CREATE INDEX idx_applications_company_id ON applications(company_id);
 CREATE INDEX idx_applications_grant_id ON applications(grant_id);
 CREATE INDEX idx_applications_status ON applications(status);
+CREATE INDEX idx_applications_user_status ON applications(user_id, status);
+CREATE INDEX idx_applications_company_status ON applications(company_id, status);
 
 -- Create payment_transactions table
 CREATE TABLE payment_transactions (
-    id SERIAL PRIMARY KEY,
-    user_id INTEGER NOT NULL,
+    id BIGINT GENERATED BY DEFAULT AS IDENTITY PRIMARY KEY,
+    user_id BIGINT NOT NULL,
     stripe_payment_intent_id VARCHAR(255) NOT NULL UNIQUE,
     stripe_session_id VARCHAR(255) UNIQUE,
     amount INTEGER NOT NULL, -- in cents
     currency VARCHAR(3) DEFAULT 'EUR',
     description VARCHAR(500),
-    status VARCHAR(50) DEFAULT 'pending',
-    product_type VARCHAR(50),
+    status paymentstatus DEFAULT 'pending',
+    product_type producttype,
     credits_added INTEGER DEFAULT 0,
     created_at TIMESTAMPTZ DEFAULT NOW(),
     updated_at TIMESTAMPTZ
 );
 
 -- Create indexes for payment_transactions
-CREATE INDEX idx_payment_transactions_user_id ON payment_transactions(user_id);
 CREATE INDEX idx_payment_transactions_status ON payment_transactions(status);
+CREATE INDEX idx_payment_transactions_user_status ON payment_transactions(user_id, status);
+CREATE INDEX idx_payment_transactions_pending_created_at ON payment_transactions(created_at) WHERE status = 'pending';
 
 -- Add foreign key constraints
 ALTER TABLE users ADD CONSTRAINT fk_users_company FOREIGN KEY (company_id) REFERENCES companies(id);
@@ -8,34 +8,38 @@ the Supabase REST API to verify the database setup.
 
 import os
 import sys
-import requests
-import json
+import asyncio
+import httpx
 from dotenv import load_dotenv
 
 # Load environment variables
 load_dotenv()
 
 
-def check_api_connection():
+def get_api_client():
+    """Create one HTTP client shared by all Supabase REST API checks, or None without credentials."""
+    url = os.getenv("SUPABASE_URL")
+    key = os.getenv("SUPABASE_ANON_KEY")
+    
+    if not url or not key:
+        return None
+    
+    return httpx.AsyncClient(
+        base_url=f"{url}/rest/v1",
+        headers={
+            "apikey": key,
+            "Content-Type": "application/json"
+        },
+        timeout=10
+    )
+
+
+async def check_api_connection(client):
     """Check if Supabase API is accessible."""
     try:
-        url = os.getenv("SUPABASE_URL")
-        key = os.getenv("SUPABASE_ANON_KEY")
-        
-        if not url or not key:
-            print("❌ Missing SUPABASE_URL or SUPABASE_ANON_KEY")
-            return False
-        
         print(f"🔄 Testing Supabase API connection...")
         
-        response = requests.get(
-            f"{url}/rest/v1/",
-            headers={
-                "apikey": key,
-                "Content-Type": "application/json"
-            },
-            timeout=10
-        )
+        response = await client.get("/")
         
         if response.status_code in [200, 401]:  # 401 is expected without proper auth
             print(f"✅ Supabase API is accessible!")
@@ -49,33 +53,47 @@ def check_api_connection():
         return False
 
 
-def check_tables_exist():
+async def fetch_exposed_tables(client):
+    """Get the table names from PostgREST's OpenAPI document, or None if it isn't served."""
+    try:
+        response = await client.get("/", headers={"Accept": "application/openapi+json"})
+        if response.status_code != 200:
+            return None
+        definitions = response.json().get("definitions")
+        return set(definitions) if definitions else None
+    except Exception:
+        return None
+
+
+async def probe_tables(client, tables):
+    """Probe each table directly; a failed probe means the table is missing."""
+    # All tables are probed concurrently. HEAD with a one-row range gets the
+    # status without a body
+    responses = await asyncio.gather(
+        *(
+            client.head(f"/{table}", headers={"Range-Unit": "items", "Range": "0-0"}, timeout=5)
+            for table in tables
+        ),
+        return_exceptions=True
+    )
+    return [
+        table for table, response in zip(tables, responses)
+        if not isinstance(response, Exception) and response.status_code in (200, 206)
+    ]
+
+
+async def check_tables_exist(client):
     """Check if our tables exist via REST API."""
     try:
-        url = os.getenv("SUPABASE_URL")
-        key = os.getenv("SUPABASE_ANON_KEY")
-        
         tables_to_check = ["grants", "users", "companies", "applications", "payment_transactions"]
-        existing_tables = []
         
         print(f"🔄 Checking for existing tables...")
         
-        for table in tables_to_check:
-            try:
-                response = requests.get(
-                    f"{url}/rest/v1/{table}?limit=1",
-                    headers={
-                        "apikey": key,
-                        "Content-Type": "application/json"
-                    },
-                    timeout=5
-                )
-                
-                if response.status_code == 200:
-                    existing_tables.append(table)
-                    
-            except Exception:
-                continue
+        exposed_tables = await fetch_exposed_tables(client)
+        if exposed_tables is not None:
+            existing_tables = [table for table in tables_to_check if table in exposed_tables]
+        else:
+            existing_tables = await probe_tables(client, tables_to_check)
         
         if existing_tables:
             print(f"✅ Found existing tables: {', '.join(existing_tables)}")
@@ -89,31 +107,28 @@ def check_tables_exist():
         return []
 
 
-def check_sample_data():
+async def check_sample_data(client):
     """Check if we have sample grant data."""
     try:
-        url = os.getenv("SUPABASE_URL")
-        key = os.getenv("SUPABASE_ANON_KEY")
-        
         print(f"🔄 Checking for sample data...")
         
-        response = requests.get(
-            f"{url}/rest/v1/grants?select=grant_id,title&limit=10",
-            headers={
-                "apikey": key,
-                "Content-Type": "application/json"
-            },
-            timeout=10
+        # Only the 3 grants that are shown; the total comes back in the
+        # Content-Range header ("0-2/<total>")
+        response = await client.get(
+            "/grants?select=grant_id,title&limit=3",
+            headers={"Prefer": "count=exact", "Range-Unit": "items", "Range": "0-2"}
         )
         
-        if response.status_code == 200:
+        if response.status_code in (200, 206):
             grants = response.json()
             if grants:
-                print(f"✅ Found {len(grants)} sample grants:")
-                for grant in grants[:3]:  # Show first 3
+                total = response.headers.get("Content-Range", "").rpartition("/")[2]
+                total = int(total) if total.isdigit() else len(grants)
+                print(f"✅ Found {total} sample grants:")
+                for grant in grants:
                     print(f"   • {grant['grant_id']}: {grant['title'][:50]}...")
-                if len(grants) > 3:
-                    print(f"   ... and {len(grants) - 3} more")
+                if total > len(grants):
+                    print(f"   ... and {total - len(grants)} more")
                 return True
             else:
                 print(f"⚠️  No sample grants found")
@@ -214,40 +229,60 @@ def test_backend_compatibility():
         return False
 
 
-def main():
+async def main():
     """Main setup verification function."""
+    # Output is written out once per step rather than on every line
+    sys.stdout.reconfigure(line_buffering=False)
     print("🔧 EU GRANTS MONITOR - API-BASED SETUP CHECK")
     print("=" * 60)
     
     # Step 1: Check API connection
     print("\n📋 STEP 1: SUPABASE API CONNECTION")
     print("-" * 40)
-    if not check_api_connection():
+    sys.stdout.flush()
+    client = get_api_client()
+    if client is None:
+        print("❌ Missing SUPABASE_URL or SUPABASE_ANON_KEY")
         print("\n❌ Cannot access Supabase API")
         print("   Check your SUPABASE_URL and SUPABASE_ANON_KEY in .env")
         return False
     
-    # Step 2: Check if tables exist
-    print("\n📋 STEP 2: DATABASE TABLES")
-    print("-" * 40)
-    existing_tables = check_tables_exist()
-    
-    if len(existing_tables) >= 3:  # At least grants, users, companies
-        print("✅ Database schema appears to be set up!")
-        schema_ready = True
-    else:
-        print("⚠️  Database schema needs to be created")
-        schema_ready = False
-    
-    # Step 3: Check sample data
-    print("\n📋 STEP 3: SAMPLE DATA")
-    print("-" * 40)
-    has_data = check_sample_data()
+    # One client for steps 1-3, so the TLS connection is set up only once
+    async with client:
+        if not await check_api_connection(client):
+            print("\n❌ Cannot access Supabase API")
+            print("   Check your SUPABASE_URL and SUPABASE_ANON_KEY in .env")
+            return False
+        
+        # Step 2: Check if tables exist
+        print("\n📋 STEP 2: DATABASE TABLES")
+        print("-" * 40)
+        sys.stdout.flush()
+        existing_tables = await check_tables_exist(client)
+        
+        if len(existing_tables) >= 3:  # At least grants, users, companies
+            print("✅ Database schema appears to be set up!")
+            schema_ready = True
+        else:
+            print("⚠️  Database schema needs to be created")
+            schema_ready = False
+        
+        # Step 3: Check sample data
+        print("\n📋 STEP 3: SAMPLE DATA")
+        print("-" * 40)
+        sys.stdout.flush()
+        has_data = await check_sample_data(client)
     
     # Step 4: Test backend compatibility
     print("\n📋 STEP 4: BACKEND COMPATIBILITY")
     print("-" * 40)
-    backend_ok = test_backend_compatibility()
+    sys.stdout.flush()
+    if schema_ready:
+        backend_ok = test_backend_compatibility()
+    else:
+        # Manual setup is needed anyway, so skip importing the app's models
+        print("⏭️  Skipped until the database schema is set up")
+        backend_ok = False
     
     # Summary and next steps
     print(f"\n{'='*60}")
@@ -274,5 +309,5 @@ def main():
 
 
 if __name__ == "__main__":
-    success = main()
+    success = asyncio.run(main())
     sys.exit(0 if success else 1)
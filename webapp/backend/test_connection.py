@@ -3,6 +3,7 @@
 Test Supabase database connection.
 """
 
+import asyncio
 import os
 import sys
 from dotenv import load_dotenv
@@ -10,62 +11,35 @@ from dotenv import load_dotenv
 # Load environment variables
 load_dotenv()
 
-# Test sync connection
-def test_sync_connection():
-    """Test synchronous database connection."""
+# Test database connection (asyncpg, like the app)
+async def test_database_connection():
+    """Test the database connection through the app's async engine."""
     try:
-        from sqlalchemy import create_engine, text
-        
-        database_url = os.getenv("SUPABASE_DATABASE_URL")
-        if not database_url:
-            print("❌ SUPABASE_DATABASE_URL not found in environment")
-            return False
-            
-        print(f"🔄 Testing sync connection to: {database_url.split('@')[1].split(':')[0]}")
-        
-        engine = create_engine(database_url)
-        
-        with engine.connect() as conn:
-            result = conn.execute(text("SELECT version(), current_database(), current_user;"))
-            row = result.fetchone()
-            
-        print(f"✅ Sync connection successful!")
-        print(f"   PostgreSQL Version: {row[0].split(' ')[1]}")
-        print(f"   Database: {row[1]}")
-        print(f"   User: {row[2]}")
-        return True
-        
-    except Exception as e:
-        print(f"❌ Sync connection failed: {e}")
-        return False
-
-
-# Test async connection
-async def test_async_connection():
-    """Test asynchronous database connection."""
-    try:
-        from sqlalchemy.ext.asyncio import create_async_engine
         from sqlalchemy import text
+        from app.database import get_async_engine
         
-        database_url = os.getenv("SUPABASE_DATABASE_URL")
-        async_url = database_url.replace("postgresql://", "postgresql+asyncpg://")
-        
-        print(f"🔄 Testing async connection...")
+        print(f"🔄 Testing database connection...")
         
-        async_engine = create_async_engine(async_url)
+        # The app's own async engine, so this exercises its pool settings too
+        async_engine = get_async_engine()
+        if async_engine is None:
+            raise RuntimeError("Async database sessions not configured")
         
-        async with async_engine.begin() as conn:
-            result = await conn.execute(text("SELECT version(), current_database(), current_user;"))
-            row = result.fetchone()
+        try:
+            async with async_engine.connect() as conn:
+                result = await conn.execute(text("SELECT current_setting('server_version_num')::int, current_database(), current_user;"))
+                row = result.fetchone()
+        finally:
+            await async_engine.dispose()
             
-        print(f"✅ Async connection successful!")
-        print(f"   PostgreSQL Version: {row[0].split(' ')[1]}")
+        print(f"✅ Database connection successful!")
+        print(f"   PostgreSQL Version: {row[0] // 10000}.{row[0] % 100}")
         print(f"   Database: {row[1]}")
         print(f"   User: {row[2]}")
         return True
         
     except Exception as e:
-        print(f"❌ Async connection failed: {e}")
+        print(f"❌ Database connection failed: {e}")
         return False
 
 
@@ -107,31 +81,29 @@ def test_supabase_client():
 
 def main():
     """Main test function."""
+    # Output is written out once per test rather than on every line
+    sys.stdout.reconfigure(line_buffering=False)
     print("🟢 SUPABASE CONNECTION TEST")
     print("=" * 40)
     
-    # Test 1: Sync connection
-    print("\n1. Testing synchronous connection:")
-    sync_ok = test_sync_connection()
-    
-    # Test 2: Async connection  
-    print("\n2. Testing asynchronous connection:")
-    import asyncio
-    async_ok = asyncio.run(test_async_connection())
+    # Test 1: Database connection
+    print("\n1. Testing database connection:")
+    sys.stdout.flush()
+    db_ok = asyncio.run(test_database_connection())
     
-    # Test 3: Supabase client
-    print("\n3. Testing Supabase Python client:")
+    # Test 2: Supabase client
+    print("\n2. Testing Supabase Python client:")
+    sys.stdout.flush()
     client_ok = test_supabase_client()
     
     # Summary
     print(f"\n{'='*40}")
     print("🎯 TEST RESULTS:")
-    print(f"   Sync Connection:     {'✅ OK' if sync_ok else '❌ Failed'}")
-    print(f"   Async Connection:    {'✅ OK' if async_ok else '❌ Failed'}")
+    print(f"   Database Connection: {'✅ OK' if db_ok else '❌ Failed'}")
     print(f"   Supabase Client:     {'✅ OK' if client_ok else '❌ Failed'}")
     
-    if sync_ok and async_ok:
-        print(f"\n🎉 All database connections working!")
+    if db_ok:
+        print(f"\n🎉 Database connection working!")
         print("✅ Your Supabase setup is ready for the EU Grants Monitor!")
         return True
     else: